@@ -0,0 +1,520 @@
+import argparse
+import asyncio
+import multiprocessing
+import random
+import sys
+import time
+
+import proto.chat_pb2 as chat
+
+from bots import Bot, Stats, free_port, percentile, process_usage, run_server
+from sessions import Session, Sessions
+
+
+class Listener(Session):
+    # Chat lines carry their send time, as bots' do, and every line that
+    # arrives is timed
+
+    def __init__(self, sessions, nickname):
+        super().__init__(sessions, nickname)
+        self.latencies = []
+
+    def on_note(self, note):
+        if note.name:
+            self.latencies.append((time.perf_counter_ns() - int(note.message)) / 1e9)
+
+
+class CountingBot(Bot):
+    # Counts the bytes of every note its stream carries
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.sizes = {}
+        self.roles = 0
+
+    def on_note(self, note):
+        self.sizes[note.seq] = note.ByteSize()
+        if note.message.startswith("YOU ARE "):
+            self.roles += 1
+        super().on_note(note)
+
+
+def start_server(size, turn_seconds=0.2, pause_seconds=0.01):
+    # In its own process, so its CPU can be read apart from the clients'
+    port = free_port()
+    process = multiprocessing.Process(
+        target=run_server, args=(port, size, turn_seconds, pause_seconds, None), daemon=True
+    )
+    process.start()
+    return f"localhost:{port}", process
+
+
+async def until(condition, timeout):
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    return condition()
+
+
+async def join(sessions, players, room_id=None):
+    tasks = []
+    for player in players:
+        await player.connect(room_id)
+        tasks.append(asyncio.create_task(player.run()))
+    return tasks
+
+
+async def leave(players, tasks):
+    for player in players:
+        player.leave()
+    await asyncio.wait(tasks, timeout=10)
+
+
+async def fanout(args):
+    # Idle streams should cost the server nothing, and a burst of chat should
+    # reach every stream as it is sent
+    address, server = start_server(args.streams + 1)
+    sessions = Sessions(address)
+    try:
+        await sessions.ready(timeout=10)
+        players = [Listener(sessions, f"p{i}") for i in range(args.streams)]
+        tasks = await join(sessions, players)
+        await asyncio.sleep(1)
+
+        before = process_usage(server.pid)
+        await asyncio.sleep(args.idle)
+        after = process_usage(server.pid)
+        print(f"idle: {args.streams} streams, server cpu {(after[0] - before[0]) / args.idle * 100:.1f}% "
+              f"over {args.idle:.0f}s")
+
+        sender, listeners = players[0], players[1:]
+        before = process_usage(server.pid)
+        for _ in range(args.burst):
+            sender.send(str(time.perf_counter_ns()))
+        expected = args.burst * len(listeners)
+        await until(lambda: sum(len(p.latencies) for p in listeners) >= expected, 30)
+        after = process_usage(server.pid)
+        latencies = [t for p in listeners for t in p.latencies]
+        print(f"burst: {args.burst} lines to {len(listeners)} streams, delivered {len(latencies)}/{expected}, "
+              f"p50 {percentile(latencies, 50) * 1e3:.2f}ms, p99 {percentile(latencies, 99) * 1e3:.2f}ms, "
+              f"server cpu {after[0] - before[0]:.2f}s")
+        await leave(players, tasks)
+    finally:
+        await sessions.close()
+        server.terminate()
+
+
+async def upstream(args):
+    # One session sending chat lines as fast as it can, a unary SendNote
+    # call per line against one SendNotes stream for all of them
+    address, server = start_server(10)
+    sessions = Sessions(address)
+    try:
+        await sessions.ready(timeout=10)
+        listener = Listener(sessions, "listener")
+        tasks = await join(sessions, [listener])
+        for mode in ("unary", "streaming"):
+            sender = Session(sessions, mode)
+            await sender.connect()
+            listener.latencies = []
+            started = time.perf_counter()
+            if mode == "unary":
+                for _ in range(args.lines):
+                    await sender.send_note(sender.note(str(time.perf_counter_ns())))
+            else:
+                for _ in range(args.lines):
+                    sender.send(str(time.perf_counter_ns()))
+                # Returns once the server has handled every line
+                await sender.close()
+            elapsed = time.perf_counter() - started
+            await until(lambda: len(listener.latencies) >= args.lines, 30)
+            print(f"{mode}: {args.lines / elapsed:.0f} notes/s, delivered {len(listener.latencies)}/{args.lines}")
+            await sender.send_note(sender.note("/leave"))
+        await leave([listener], tasks)
+    finally:
+        await sessions.close()
+        server.terminate()
+
+
+async def streams(args):
+    # Thousands of open streams in one server process, which must still
+    # take new players and deliver to all of them
+    address, server = start_server(args.room_size + 1)
+    sessions = Sessions(address)
+    try:
+        await sessions.ready(timeout=10)
+        players = [Listener(sessions, f"p{i}") for i in range(args.streams)]
+        rooms = -(-args.streams // args.room_size)
+        connect = []
+        tasks = []
+        t = time.perf_counter()
+        for i, player in enumerate(players):
+            started = time.perf_counter()
+            await player.connect(i // args.room_size + 1)
+            connect.append(time.perf_counter() - started)
+            tasks.append(asyncio.create_task(player.run()))
+        await asyncio.sleep(1)
+        print(f"{args.streams} streams in {rooms} rooms opened in "
+              f"{time.perf_counter() - t:.2f}s, connect p50 {percentile(connect, 50) * 1e3:.2f}ms, "
+              f"p99 {percentile(connect, 99) * 1e3:.2f}ms")
+
+        # With every stream open, a newcomer is served right away
+        newcomer = Session(sessions, "newcomer")
+        started = time.perf_counter()
+        await newcomer.connect(rooms + 1)
+        await newcomer.send_note(newcomer.note("hello"))
+        print(f"connect and send with every stream open: {(time.perf_counter() - started) * 1e3:.2f}ms")
+
+        # One line into every room, timed at every stream
+        before = process_usage(server.pid)
+        senders = players[::args.room_size]
+        for sender in senders:
+            sender.send(str(time.perf_counter_ns()))
+        expected = len(players) - len(senders)
+        await until(lambda: sum(len(p.latencies) for p in players) >= expected, 60)
+        after = process_usage(server.pid)
+        latencies = [t for p in players for t in p.latencies]
+        print(f"one line per room: delivered {len(latencies)}/{expected}, p50 {percentile(latencies, 50) * 1e3:.2f}ms, "
+              f"p99 {percentile(latencies, 99) * 1e3:.2f}ms")
+        print(f"server cpu {after[0] - before[0]:.2f}s for the lines, rss {after[1]:.1f}MiB")
+        await leave(players + [newcomer], tasks)
+    finally:
+        await sessions.close()
+        server.terminate()
+
+
+async def stream_bytes(args):
+    # What each player's stream carries in one game, against every note of
+    # the room, which is what each of them got before private notes were
+    # routed on the server
+    address, server = start_server(args.players)
+    sessions = Sessions(address)
+    try:
+        await sessions.ready(timeout=10)
+        stats = Stats()
+        rng = random.Random(args.seed)
+        players = [
+            CountingBot(sessions, f"bot{i}", stats, random.Random(rng.random()), 0.05, 2)
+            for i in range(args.players)
+        ]
+        for player in players:
+            player.room = players
+        tasks = await join(sessions, players)
+        await asyncio.wait_for(asyncio.gather(*(p.finished.wait() for p in players)), args.timeout)
+        await leave(players, tasks)
+    finally:
+        await sessions.close()
+        server.terminate()
+
+    room = {}
+    for player in players:
+        room.update(player.sizes)
+    everything = sum(room.values())
+    sent = sorted(sum(p.sizes.values()) for p in players)
+    print(f"{args.players} players, {len(room)} notes in the room ({everything}B)")
+    print(f"bytes per stream: min {sent[0]}B, p50 {percentile(sent, 50)}B, max {sent[-1]}B, "
+          f"{sum(sent) / len(sent) / everything:.0%} of the room on average")
+    print(f"notes per stream: min {min(len(p.sizes) for p in players)}, max {max(len(p.sizes) for p in players)}")
+    # Every player is dealt one role, and only its own
+    if any(p.roles != 1 for p in players):
+        print(f"FAILED: role notes per stream {[p.roles for p in players]}")
+        sys.exit(1)
+
+
+async def routing(args):
+    # The cost of routing one chat line, in-process, as rooms grow: the
+    # recipients come from the registry's index, where a scan would walk
+    # every member
+    from limits import Limits
+    from members import Member
+    from rooms import Room
+    from scheduler import PhaseScheduler
+
+    inf = float("inf")
+    for size in args.sizes:
+        room = Room(1, size, lambda room, member: None, PhaseScheduler(), turn_seconds=3600, pause_seconds=0,
+                    limits=Limits(inf, inf, inf, inf, max_lag=inf))
+        for i in range(size):
+            room.join(Member(f"p{i}", i + 1))
+        await until(lambda: room._step == "mafia", 10)
+        mafia = next(iter(room.members.with_role("mafia")))
+        citizens = sorted(room.members.with_role("citizen"))
+        line = chat.Note(member_id=mafia, name="mafia", message="psst", command=chat.CHAT)
+
+        started = time.perf_counter()
+        for _ in range(args.lines):
+            room.members.with_role("mafia")
+        lookup = (time.perf_counter() - started) / args.lines
+        started = time.perf_counter()
+        for _ in range(args.lines):
+            {m.member_id for m in room.members.values() if m.role == "mafia"}
+        scan = (time.perf_counter() - started) / args.lines
+        started = time.perf_counter()
+        for _ in range(args.lines):
+            room.message_handler(line)
+        handle = (time.perf_counter() - started) / args.lines
+        # The first day line after a death gets the living from the index again
+        room.begin("day")
+        changed = []
+        for member_id in citizens[:args.deaths]:
+            room.members[member_id].dead()
+            started = time.perf_counter()
+            room.message_handler(chat.Note(member_id=mafia, name="mafia", message="hi", command=chat.CHAT))
+            changed.append(time.perf_counter() - started)
+        print(f"{size:>5} members: recipients {lookup * 1e6:.2f}us (scan {scan * 1e6:.2f}us), "
+              f"night line {handle * 1e6:.2f}us, day line after a death p50 "
+              f"{percentile(changed, 50) * 1e6:.2f}us")
+        room._game.cancel()
+
+
+async def memory(args):
+    # What the server keeps for a room, a member and a running game, in a
+    # server in this process so tracemalloc sees all of it. Rooms are opened
+    # empty first, then filled up to one seat short of a game, then the
+    # last seats start every game, and each step is counted on its own.
+    import gc
+    import tracemalloc
+    from server import ChatServer
+
+    server = ChatServer(args.size, grace_seconds=3600)
+    rooms = args.players // args.size
+    gc.collect()
+    tracemalloc.start()
+
+    async def step(change):
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        await change()
+        # Let full rooms start their games
+        await asyncio.sleep(0.5)
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - before
+
+    async def open_rooms():
+        for _ in range(rooms):
+            server.open_room()
+
+    async def seat(count):
+        for room in list(server.rooms.values()):
+            for i in range(count):
+                request = chat.Connection(nickname=f"bot{room.room_id}_{len(room.members)}", room_id=room.room_id)
+                reply = await server.Connect(request, None)
+                server.attach(reply.member_id)
+
+    empty = await step(open_rooms)
+    lobby = await step(lambda: seat(args.size - 1))
+    started = await step(lambda: seat(1))
+    tracemalloc.stop()
+    member = lobby / (rooms * (args.size - 1))
+    game = started / rooms - member
+    print(f"{rooms} rooms of {args.size}, {len(server.members)} members, "
+          f"{sum(room.running for room in server.rooms.values())} games running")
+    print(f"empty room {empty / rooms:.0f}B, member {member:.0f}B, running game {game:.0f}B on top of its members")
+    total = empty + lobby + started
+    print(f"total {total / 2 ** 20:.1f}MiB, {total / len(server.members):.0f}B per member with its share of the room")
+
+
+async def encode(args):
+    # What a broadcast costs in encoding as a room grows: the log encodes a
+    # note once and every stream reads the shared frame, where each stream
+    # used to have grpc encode its own copy
+    from chatlog import ChatLog
+
+    message = "x" * args.message_bytes
+    for subscribers in args.subscribers:
+        log = ChatLog(max_lag=float("inf"))
+        for key in range(subscribers):
+            log.subscribe(key)
+        # Reading the log is the same per stream either way and is timed apart
+        shared = reads = 0
+        for _ in range(args.notes):
+            note = chat.Note(member_id=1, name="player", message=message)
+            started = time.perf_counter()
+            log.append(note)
+            shared += time.perf_counter() - started
+            started = time.perf_counter()
+            for key in range(subscribers):
+                await log.read(key)
+            reads += time.perf_counter() - started
+        shared /= args.notes
+        reads /= args.notes
+
+        note = chat.Note(member_id=1, name="player", message=message, seq=0)
+        started = time.perf_counter()
+        for _ in range(args.notes):
+            for key in range(subscribers):
+                note.SerializeToString()
+        copies = (time.perf_counter() - started) / args.notes
+        print(f"{subscribers:>5} subscribers: encoded once {shared * 1e6:.1f}us, "
+              f"a copy per stream {copies * 1e6:.1f}us, reading the log {reads / subscribers * 1e9:.0f}ns per stream")
+
+
+def check_server(server):
+    # The single writer keeps every member in exactly the room that holds it
+    problems = []
+    for member_id, room in server.members.items():
+        if member_id not in room.members:
+            problems.append(f"member {member_id} is not in room {room.room_id}")
+        if server.rooms.get(room.room_id) is not room:
+            problems.append(f"member {member_id} is in a room the server dropped")
+    for room in server.rooms.values():
+        for member_id in room.members:
+            if server.members.get(member_id) is not room:
+                problems.append(f"room {room.room_id} holds member {member_id} the server does not route to it")
+    return problems
+
+
+async def stress(args):
+    # Many sessions at once on a server in this process, each sending random
+    # commands at random moments, joining and leaving or dropping their
+    # stream, with short turns so games start and stop under them. Each
+    # run draws its choices from a seed.
+    import grpc
+    from limits import Limits
+    from metrics import metrics
+    from server import SERVER_OPTIONS, ChatServer, add_servicer
+
+    inf = float("inf")
+    commands = ["/kill", "/execute", "/verify", "/skip", "/members", "/me", "/help", "/ready", "hi"]
+    failed = False
+    for seed in range(args.seed, args.seed + args.seeds):
+        rng = random.Random(seed)
+        errors = []
+        # Each broken invariant once, however long it stays broken
+        problems = set()
+        loop = asyncio.get_running_loop()
+        # Game tasks that fail are reported here instead of only being logged
+        loop.set_exception_handler(
+            lambda loop, context: errors.append(f"{context['message']}: {context.get('exception')!r}")
+        )
+        server = ChatServer(args.size, turn_seconds=0.02, pause_seconds=0.005, grace_seconds=1,
+                            limits=Limits(inf, inf, inf, inf))
+        grpc_server = grpc.aio.server(options=SERVER_OPTIONS)
+        add_servicer(server, grpc_server)
+        port = grpc_server.add_insecure_port("localhost:0")
+        await grpc_server.start()
+        sessions = Sessions(f"localhost:{port}")
+
+        async def player(i, rng):
+            for _ in range(args.lives):
+                session = Session(sessions, f"p{i}")
+                room_id = rng.randint(1, args.players // args.size) if rng.random() < 0.3 else None
+                try:
+                    await session.connect(room_id)
+                except grpc.aio.AioRpcError as e:
+                    if e.code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+                        errors.append(f"connect: {e.code()} {e.details()}")
+                    continue
+                reader = asyncio.create_task(session.run())
+                for _ in range(rng.randint(0, args.commands)):
+                    await asyncio.sleep(rng.random() * 0.01)
+                    command = rng.choice(commands)
+                    if command in ("/kill", "/execute", "/verify"):
+                        command += f" {rng.randint(1, session.id + 3)}"
+                    try:
+                        await session.send_note(session.note(command))
+                    except grpc.aio.AioRpcError as e:
+                        errors.append(f"{command}: {e.code()} {e.details()}")
+                if rng.random() < 0.2:
+                    # Gone without a word; the grace period makes it leave
+                    reader.cancel()
+                else:
+                    await session.send_note(session.note("/leave"))
+                await asyncio.wait([reader], timeout=5)
+                if not reader.done():
+                    errors.append(f"p{i}: stream still open after /leave")
+                    reader.cancel()
+                elif not reader.cancelled() and reader.exception() is not None:
+                    e = reader.exception()
+                    # A player may leave before its stream is open
+                    if not isinstance(e, grpc.aio.AioRpcError) or e.code() != grpc.StatusCode.NOT_FOUND:
+                        errors.append(f"p{i} stream: {e!r}")
+
+        async def watch():
+            while True:
+                problems.update(check_server(server))
+                await asyncio.sleep(0.005)
+
+        watcher = asyncio.create_task(watch())
+        before = metrics.counters.copy()
+        started = time.perf_counter()
+        await asyncio.gather(*(player(i, random.Random(rng.random())) for i in range(args.players)))
+        await until(lambda: not server.members and not server.gauges()["streams"], 5)
+        watcher.cancel()
+        problems.update(check_server(server))
+        left = server.gauges()
+        if left["members"] or left["streams"] or left["rooms"]:
+            problems.add(f"left behind: {left['members']} members, {left['streams']} streams, {left['rooms']} rooms")
+        games = metrics.counters - before
+        print(f"seed {seed}: {time.perf_counter() - started:.1f}s, {games['connects']} joins, "
+              f"{games['games_started']} games started, {games['games_stopped']} stopped, "
+              f"{games['games_finished']} finished, {games['members_evicted']} evicted, "
+              f"{len(errors)} errors, {len(problems)} broken invariants")
+        for line in (errors + sorted(problems))[:5]:
+            print(f"  {line}")
+        failed = failed or bool(errors or problems)
+        await sessions.close()
+        await grpc_server.stop(0)
+        loop.set_exception_handler(None)
+    if failed:
+        print("FAILED")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the mafia server")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("fanout", help="server CPU with idle streams and delivery latency of a chat burst")
+    command.add_argument("--streams", type=int, default=100)
+    command.add_argument("--idle", type=float, default=5, help="seconds to measure idle CPU over")
+    command.add_argument("--burst", type=int, default=200, help="chat lines sent at once")
+    command.set_defaults(run=fanout)
+
+    command = commands.add_parser("upstream", help="notes per second of unary SendNote calls and one SendNotes stream")
+    command.add_argument("--lines", type=int, default=5000)
+    command.set_defaults(run=upstream)
+
+    command = commands.add_parser("streams", help="thousands of open streams in one process")
+    command.add_argument("--streams", type=int, default=3000)
+    command.add_argument("--room-size", type=int, default=100, help="players per room; rooms never fill up")
+    command.set_defaults(run=streams)
+
+    command = commands.add_parser("bytes", help="bytes each stream carries in one game")
+    command.add_argument("--players", type=int, default=20)
+    command.add_argument("--timeout", type=float, default=60)
+    command.add_argument("--seed", type=int, default=0)
+    command.set_defaults(run=stream_bytes)
+
+    command = commands.add_parser("routing", help="cost of routing a chat line against the size of the room")
+    command.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    command.add_argument("--lines", type=int, default=10000, help="lines timed in each room")
+    command.add_argument("--deaths", type=int, default=5, help="day lines timed, each after a death")
+    command.set_defaults(run=routing)
+
+    command = commands.add_parser("memory", help="memory the server keeps per room, member and running game")
+    command.add_argument("--players", type=int, default=100000)
+    command.add_argument("--size", type=int, default=10, help="players per room")
+    command.set_defaults(run=memory)
+
+    command = commands.add_parser("encode", help="encoding cost of a broadcast against the number of subscribers")
+    command.add_argument("--subscribers", type=int, nargs="+", default=[10, 100, 1000])
+    command.add_argument("--notes", type=int, default=1000, help="notes timed at each size")
+    command.add_argument("--message-bytes", type=int, default=64)
+    command.set_defaults(run=encode)
+
+    command = commands.add_parser("stress", help="randomized schedules of many concurrent clients")
+    command.add_argument("--seeds", type=int, default=5, help="schedules to run")
+    command.add_argument("--seed", type=int, default=0, help="first seed")
+    command.add_argument("--players", type=int, default=40)
+    command.add_argument("--size", type=int, default=4)
+    command.add_argument("--lives", type=int, default=3, help="times each player joins")
+    command.add_argument("--commands", type=int, default=60, help="most commands a player sends per join")
+    command.set_defaults(run=stress)
+
+    args = parser.parse_args()
+    asyncio.run(args.run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import time
+
+import grpc
+
+from commands import client_commands
+from sessions import Session, Sessions
+
+# Chat lines carry their send time so receivers in this process can
+# measure delivery latency
+STAMP = "@"
+
+
+class Stats:
+
+    def __init__(self):
+        self.connect = []
+        self.delivery = []
+        self.received = 0
+        self.limited = 0
+        self.games = 0
+        self.game_seconds = []
+
+
+class Bot(Session):
+
+    def __init__(self, sessions, nickname, stats, rng, think, chat_lines, address=None, upstream=None):
+        # Notes may go through another node, which forwards them to the owner
+        super().__init__(sessions, nickname, address, upstream)
+        self.stats = stats
+        self.rng = rng
+        self.think = think
+        self.chat_lines = chat_lines
+        self.role = None
+        # Bots in the same room, filled in as they connect
+        self.room = []
+        self.started = None
+        self.finished = asyncio.Event()
+
+    async def connect(self, room_id=None):
+        t = time.perf_counter()
+        reply = await super().connect(room_id)
+        self.stats.connect.append(time.perf_counter() - t)
+        return reply
+
+    async def run(self):
+        try:
+            await super().run()
+        except grpc.aio.AioRpcError:
+            pass
+
+    def on_limited(self, details):
+        self.stats.limited += 1
+
+    def on_note(self, note):
+        self.stats.received += 1
+        text = note.message.strip()
+        if note.name and text.startswith(STAMP):
+            sent = int(text[len(STAMP):].split(" ", 1)[0])
+            self.stats.delivery.append((time.perf_counter_ns() - sent) / 1e9)
+        elif text == "STARTING GAME":
+            self.started = time.perf_counter()
+        elif text.startswith("YOU ARE "):
+            self.role = text[len("YOU ARE "):]
+        elif text == "MAFIA IS DOING ITS DARK DEEDS" and self.role == "mafia":
+            self.later(f"{client_commands.KILL} {self.target()}")
+        elif text == "CHERIF WOKE UP TO FIND MAFIA" and self.role == "cherif":
+            self.later(f"{client_commands.VERIFY} {self.target()}", f"{client_commands.KILL} {self.target()}")
+        elif text == "IT'S TIME TO DECIDE":
+            lines = [f"{STAMP}{{now}} hello from {self.nickname}"] * self.chat_lines
+            vote = client_commands.SKIP if self.rng.random() < 0.2 else f"{client_commands.EXECUTE} {self.target()}"
+            self.later(*lines, vote)
+        elif text in ("MAFIA WON!", "CITIZENS WON!"):
+            if self.started is not None:
+                self.stats.game_seconds.append(time.perf_counter() - self.started)
+            self.finished.set()
+
+    def target(self):
+        return self.rng.choice([b.id for b in self.room if b is not self])
+
+    def later(self, *messages):
+        asyncio.get_running_loop().create_task(self._act(messages))
+
+    async def _act(self, messages):
+        await asyncio.sleep(self.rng.random() * self.think)
+        for message in messages:
+            self.send(message.replace("{now}", str(time.perf_counter_ns())))
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def usage(pids):
+    # Summed over every server process
+    totals = [process_usage(pid) for pid in pids]
+    if not totals or None in totals:
+        return None
+    return sum(cpu for cpu, _ in totals), sum(rss for _, rss in totals)
+
+
+def process_usage(pid):
+    # CPU seconds and RSS in MiB of a local process, read from /proc
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024
+        return cpu, rss
+    except (OSError, StopIteration):
+        return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def run_server(port, size, turn_seconds, pause_seconds, journal_path, nodes=None, node=0, bus_port=None, rate=0):
+    from limits import Limits
+    from server import serve
+    # Bots play far faster than people, so the local server only limits them when asked to
+    if rate:
+        limits = Limits(member_rate=rate, room_rate=rate * size)
+    else:
+        limits = Limits(float("inf"), float("inf"), float("inf"), float("inf"))
+    asyncio.run(serve(
+        port, size, turn_seconds, pause_seconds, journal_path=journal_path,
+        nodes=nodes, node=node, bus_port=bus_port, limits=limits
+    ))
+
+
+def run_broker(port):
+    from bus import BusBroker
+    asyncio.run(BusBroker().serve(port))
+
+
+async def play(args, targets, server_pids):
+    rng = random.Random(args.seed)
+    stats = Stats()
+    # Every bot shares one channel per node
+    sessions = Sessions(targets[0])
+    try:
+        for target in targets:
+            await sessions.ready(target, 10)
+        before = usage(server_pids)
+        t = time.perf_counter()
+
+        # With several nodes, players spread over them and send their notes
+        # through the next one, the way a load balancer would
+        bots = [
+            Bot(
+                sessions, f"bot{i}", stats, random.Random(rng.random()), args.think, args.chat,
+                targets[i % len(targets)], targets[(i + 1) % len(targets)]
+            )
+            for i in range(args.players)
+        ]
+        # Players join one after another, the way a real lobby fills up, and
+        # open their stream right away: the server evicts members that stay
+        # without one for too long
+        rooms = {}
+        tasks = []
+        for bot in bots:
+            await bot.connect()
+            bot.room = rooms.setdefault(bot.room_id, [])
+            bot.room.append(bot)
+            tasks.append(asyncio.create_task(bot.run()))
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(b.finished.wait() for b in bots)), args.timeout)
+        except asyncio.TimeoutError:
+            pass
+        wall = time.perf_counter() - t
+        stats.games = len({b.room_id for b in bots if b.finished.is_set()})
+        after = usage(server_pids)
+        for bot in bots:
+            bot.leave()
+        await asyncio.wait(tasks, timeout=5)
+    finally:
+        await sessions.close()
+
+    print(f"players: {args.players}, rooms: {len(rooms)}, games finished: {stats.games}, wall: {wall:.2f}s")
+    print(f"connect latency: p50 {percentile(stats.connect, 50) * 1e3:.2f}ms, "
+          f"p99 {percentile(stats.connect, 99) * 1e3:.2f}ms")
+    print(f"delivery latency ({len(stats.delivery)} chat lines): p50 {percentile(stats.delivery, 50) * 1e3:.2f}ms, "
+          f"p99 {percentile(stats.delivery, 99) * 1e3:.2f}ms")
+    print(f"notes received: {stats.received} ({stats.received / wall:.0f}/s)")
+    if stats.limited:
+        print(f"upstreams cut for sending too fast: {stats.limited}")
+    if stats.game_seconds:
+        print(f"game length: p50 {percentile(stats.game_seconds, 50):.2f}s, "
+              f"max {max(stats.game_seconds):.2f}s")
+    if before and after:
+        print(f"server cpu: {after[0] - before[0]:.2f}s, rss: {after[1]:.1f}MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless bot players for load-testing the mafia server")
+    parser.add_argument("--players", type=int, default=40)
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--target", help="comma-separated host:port of running nodes; by default they are started locally")
+    parser.add_argument("--nodes", type=int, default=1, help="local nodes to start, joined by a bus broker")
+    parser.add_argument("--turn", type=float, default=0.2, help="seconds per player per phase")
+    parser.add_argument("--pause", type=float, default=0.01, help="seconds between phases")
+    parser.add_argument("--think", type=float, default=0.05, help="max delay before a bot acts")
+    parser.add_argument("--chat", type=int, default=2, help="chat lines per bot each day")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--journal", help="journal file for the local server, to measure its cost")
+    parser.add_argument("--rate", type=float, default=0, help="notes per second per bot the local server allows")
+    args = parser.parse_args()
+
+    processes = []
+    if args.target:
+        targets = args.target.split(",")
+    else:
+        # Servers get their own processes so their CPU and RSS can be read
+        # apart from the bots'
+        targets = [f"localhost:{free_port()}" for _ in range(args.nodes)]
+        size = max(4, args.players // args.games)
+        bus_port = None
+        if args.nodes > 1:
+            bus_port = free_port()
+            processes.append(multiprocessing.Process(target=run_broker, args=(bus_port,), daemon=True))
+            processes[0].start()
+            # Nodes connect to the broker as they start
+            time.sleep(0.2)
+        for node, target in enumerate(targets):
+            journal = args.journal and (f"{args.journal}{node}" if args.nodes > 1 else args.journal)
+            processes.append(multiprocessing.Process(
+                target=run_server,
+                args=(int(target.rsplit(":", 1)[1]), size, args.turn, args.pause, journal, targets, node, bus_port,
+                      args.rate),
+                daemon=True
+            ))
+        for process in processes[-len(targets):]:
+            process.start()
+    try:
+        asyncio.run(play(args, targets, [p.pid for p in processes[-len(targets):]] if processes else []))
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()
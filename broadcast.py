@@ -0,0 +1,138 @@
+import asyncio
+
+
+class Timeline:
+    # Spectators that asked for the same delay share one release timer per
+    # note and one wake-up, however many of them there are
+
+    def __init__(self, delay, head):
+        self.delay = delay
+        # Absolute index of the first note not released to this timeline yet
+        self.head = head
+        self.spectators = 0
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def release(self, head):
+        self.head = max(self.head, head)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class Broadcast:
+    # Public notes of one room for spectators, as the frames ChatLog already
+    # encoded. Spectators never subscribe to the room's log, so they neither
+    # hold its notes back nor see private ones, and they cost the game
+    # nothing but one append per public note.
+    DELAYS = (0, 5, 15, 30, 60, 120)
+
+    def __init__(self, keep=1000):
+        # At most this many notes are kept; a spectator further behind
+        # skips ahead
+        self.keep = keep
+        # (time appended, frame); _offset is the absolute index of _entries[0]
+        self._entries = []
+        self._offset = 0
+        self._timelines = {}
+        self._closed = False
+
+    def __len__(self):
+        return self._offset + len(self._entries)
+
+    @property
+    def spectators(self):
+        return sum(timeline.spectators for timeline in self._timelines.values())
+
+    @classmethod
+    def delay_of(cls, delay):
+        for d in cls.DELAYS:
+            if delay <= d:
+                return d
+        return cls.DELAYS[-1]
+
+    def append(self, frame):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._entries.append((now, frame))
+        head = len(self)
+        for timeline in self._timelines.values():
+            if timeline.delay:
+                loop.call_later(timeline.delay, timeline.release, head)
+            else:
+                timeline.release(head)
+        self.compact(now)
+
+    def compact(self, now):
+        # Notes are kept for the longest delay, so a new timeline still finds
+        # its history, and until every timeline has released them
+        drop = 0
+        while drop < len(self._entries) and now - self._entries[drop][0] >= self.DELAYS[-1]:
+            drop += 1
+        for timeline in self._timelines.values():
+            drop = min(drop, timeline.head - self._offset)
+        drop = max(drop, len(self._entries) - self.keep)
+        if drop > 0:
+            del self._entries[:drop]
+            self._offset += drop
+
+    def close(self):
+        # The room is gone; streams end once their timeline has released the
+        # last notes
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        for timeline in self._timelines.values():
+            loop.call_later(timeline.delay, timeline.close)
+
+    def join(self, delay):
+        delay = self.delay_of(delay)
+        timeline = self._timelines.get(delay)
+        if timeline is None:
+            # A new timeline starts with what it would have released by now
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            head = len(self)
+            for i, (stamp, _) in enumerate(self._entries):
+                if stamp + delay > now:
+                    head = self._offset + i
+                    break
+            timeline = self._timelines[delay] = Timeline(delay, head)
+            for i in range(head - self._offset, len(self._entries)):
+                loop.call_at(self._entries[i][0] + delay, timeline.release, self._offset + i + 1)
+        timeline.spectators += 1
+        return timeline
+
+    def leave(self, timeline):
+        timeline.spectators -= 1
+        if not timeline.spectators:
+            # Its pending timers still fire, on a timeline nobody waits on
+            self._timelines.pop(timeline.delay, None)
+
+    async def watch(self, delay):
+        # Yields batches of frames as the spectator's timeline releases them,
+        # starting live
+        if self._closed:
+            return
+        timeline = self.join(delay)
+        cursor = timeline.head
+        try:
+            while cursor < timeline.head or not timeline.closed:
+                if cursor >= timeline.head:
+                    await timeline.wait()
+                    continue
+                cursor = max(cursor, self._offset)
+                head = timeline.head
+                frames = [frame for _, frame in self._entries[cursor - self._offset:head - self._offset]]
+                cursor = head
+                yield frames
+        finally:
+            self.leave(timeline)
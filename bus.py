@@ -0,0 +1,121 @@
+from collections import defaultdict
+import asyncio
+import struct
+import sys
+
+# Wire frame of SocketBus: op, topic length, data length, topic, data
+FRAME = struct.Struct("<BHI")
+SUB = 1
+UNSUB = 2
+PUB = 3
+
+
+class LocalBus:
+    # Topics and callbacks within one process, e.g. several nodes in a test.
+    # Callbacks run on the next loop iteration, so a publisher always
+    # finishes its own state change first.
+
+    def __init__(self):
+        self._subscribers = defaultdict(list)
+
+    async def connect(self):
+        pass
+
+    def subscribe(self, topic, callback):
+        self._subscribers[topic].append(callback)
+
+    def unsubscribe(self, topic, callback):
+        if callback in self._subscribers.get(topic, ()):
+            self._subscribers[topic].remove(callback)
+
+    def publish(self, topic, data):
+        loop = asyncio.get_running_loop()
+        for callback in self._subscribers.get(topic, ()):
+            loop.call_soon(callback, data)
+
+
+class SocketBus(LocalBus):
+    # Same interface over a connection to a BusBroker, for nodes running as
+    # separate processes on one machine
+
+    def __init__(self, host="localhost", port=5100):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self._writer = None
+        self._task = None
+
+    async def connect(self):
+        reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        for topic in self._subscribers:
+            self._send(SUB, topic)
+        self._task = asyncio.create_task(self._run(reader))
+
+    def subscribe(self, topic, callback):
+        if not self._subscribers.get(topic) and self._writer is not None:
+            self._send(SUB, topic)
+        super().subscribe(topic, callback)
+
+    def unsubscribe(self, topic, callback):
+        super().unsubscribe(topic, callback)
+        if not self._subscribers.get(topic) and self._writer is not None:
+            self._send(UNSUB, topic)
+
+    def publish(self, topic, data):
+        self._send(PUB, topic, data)
+
+    def _send(self, op, topic, data=b""):
+        topic = topic.encode()
+        self._writer.write(FRAME.pack(op, len(topic), len(data)) + topic + data)
+
+    async def _run(self, reader):
+        loop = asyncio.get_running_loop()
+        while True:
+            op, topic, data = await read_frame(reader)
+            for callback in self._subscribers.get(topic, ()):
+                loop.call_soon(callback, data)
+
+
+async def read_frame(reader):
+    op, topic_size, data_size = FRAME.unpack(await reader.readexactly(FRAME.size))
+    topic = (await reader.readexactly(topic_size)).decode()
+    data = await reader.readexactly(data_size)
+    return op, topic, data
+
+
+class BusBroker:
+    # Relays every published frame to the connections subscribed to its topic
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+
+    async def serve(self, port):
+        server = await asyncio.start_server(self._client, "localhost", port)
+        async with server:
+            await server.serve_forever()
+
+    async def _client(self, reader, writer):
+        topics = set()
+        try:
+            while True:
+                op, topic, data = await read_frame(reader)
+                if op == SUB:
+                    topics.add(topic)
+                    self._subscribers[topic].add(writer)
+                elif op == UNSUB:
+                    topics.discard(topic)
+                    self._subscribers[topic].discard(writer)
+                else:
+                    frame = FRAME.pack(PUB, len(topic.encode()), len(data)) + topic.encode() + data
+                    for subscriber in self._subscribers.get(topic, ()):
+                        subscriber.write(frame)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for topic in topics:
+                self._subscribers[topic].discard(writer)
+            writer.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(BusBroker().serve(int(sys.argv[1]) if len(sys.argv) > 1 else 5100))
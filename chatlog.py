@@ -0,0 +1,154 @@
+import asyncio
+
+
+class SubscriberLagging(Exception):
+    pass
+
+
+class SnapshotRequired(Exception):
+    pass
+
+
+class ChatLog:
+    # What happens to a subscriber that falls more than max_lag notes behind
+    SKIP = "skip"
+    DISCONNECT = "disconnect"
+
+    def __init__(self, max_lag=1000, overflow=SKIP, compact_every=64, keep=256):
+        self.max_lag = max_lag
+        self.overflow = overflow
+        self.compact_every = compact_every
+        # The newest notes are kept even when every cursor is past them, so
+        # a client that lost its stream can resume from the last seq it saw
+        self.keep = keep
+        # Notes are kept only from the slowest live cursor onwards;
+        # _offset is the absolute index of _entries[0].
+        self._entries = []
+        self._offset = 0
+        self._bytes = 0
+        self._cursors = {}
+        self._evicted = set()
+        self._next_compact = compact_every
+        self._changed = asyncio.Event()
+        # Called with every new entry, e.g. to journal it
+        self.listener = None
+
+    def __len__(self):
+        return self._offset + len(self._entries)
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @property
+    def retained(self):
+        return len(self._entries)
+
+    @property
+    def retained_bytes(self):
+        return self._bytes
+
+    @property
+    def subscribers(self):
+        return len(self._cursors)
+
+    def entries(self):
+        return iter(self._entries)
+
+    def seek(self, offset):
+        # Where a log rebuilt from a snapshot starts
+        if not self._entries:
+            self._offset = offset
+
+    def subscribe(self, key, cursor=None):
+        self._cursors[key] = len(self) if cursor is None else max(cursor, self._offset)
+
+    def resume(self, key, cursor):
+        # Costs O(gap): the next read slices from the cursor onwards
+        if cursor < self._offset or cursor > len(self):
+            raise SnapshotRequired()
+        self._evicted.discard(key)
+        self._cursors[key] = cursor
+
+    def move(self, key, new_key):
+        # Hands a cursor over, e.g. from a member to one of its streams and back
+        if key in self._evicted:
+            self._evicted.discard(key)
+            self._evicted.add(new_key)
+        elif key in self._cursors:
+            self._cursors[new_key] = self._cursors.pop(key)
+
+    def unsubscribe(self, key):
+        self._cursors.pop(key, None)
+        self._evicted.discard(key)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, note, recipients=None):
+        # Recipients travel next to the note rather than in its `to` field,
+        # so they are not encoded into every copy that goes out, and every
+        # stream checks them in O(1): a frozenset, or a 1-tuple for a
+        # single member.
+        if recipients is None and note.to:
+            recipients = frozenset(note.to)
+        # Encoded once here and shared by every stream that sends it
+        note.seq = len(self)
+        frame = note.SerializeToString()
+        author = note.member_id if note.HasField("member_id") else 0
+        if self.listener is not None:
+            self.listener(frame, recipients, author)
+        self.restore(frame, recipients, author)
+        if len(self._entries) >= self._next_compact:
+            self.compact()
+        # Waking the current generation and starting a new one lets every
+        # waiting stream resume exactly once per batch of appends.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def restore(self, frame, recipients, author):
+        self._entries.append((frame, recipients, author))
+        self._bytes += len(frame)
+
+    def compact(self):
+        head = len(self)
+        floor = head - self.max_lag
+        low = max(head - self.keep, self._offset)
+        for key, cursor in self._cursors.items():
+            if cursor < floor:
+                if self.overflow == self.DISCONNECT:
+                    self._evicted.add(key)
+                    continue
+                cursor = self._cursors[key] = floor
+            low = min(low, cursor)
+        for key in self._evicted:
+            self._cursors.pop(key, None)
+        drop = low - self._offset
+        if drop > 0:
+            self._bytes -= sum(len(frame) for frame, _, _ in self._entries[:drop])
+            del self._entries[:drop]
+            self._offset = low
+        self._next_compact = len(self._entries) + self.compact_every
+
+    async def read(self, key, member_id=0):
+        if key not in self._cursors and key not in self._evicted:
+            # A stream that lost its cursor, e.g. to DISCONNECT, goes on from
+            # now rather than returning without ever waiting
+            self._cursors[key] = len(self)
+        if key not in self._evicted and self._cursors[key] >= len(self):
+            await self._changed.wait()
+        if key in self._evicted:
+            self._evicted.discard(key)
+            raise SubscriberLagging()
+        cursor = self._cursors.get(key)
+        if cursor is None:
+            return []
+        entries = self._entries[cursor - self._offset:]
+        self._cursors[key] = len(self)
+        return [frame for frame, recipients, author in entries if self.visible(recipients, author, member_id)]
+
+    @staticmethod
+    def visible(recipients, author, member_id):
+        if recipients is not None and member_id not in recipients:
+            return False
+        # Authors already have their own chat lines
+        return not member_id or author != member_id
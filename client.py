@@ -1,51 +1,95 @@
-import threading
-
+import asyncio
 
 import grpc
 
 import proto.chat_pb2 as chat
-import proto.chat_pb2_grpc as rpc
 
-from commands import client_commands
+from sessions import Session, Sessions
 
 HOST = 'localhost'
 PORT = 5000
 
 
-class Client:
+def print_note(note):
+    if note.name:
+        print(f"{note.name}: {note.message}")
+    else:
+        print(f"{note.message}")
+
+
+async def spectate(room_id, delay=0):
+    # Watches a room without taking a seat; only public Notes arrive
+    sessions = Sessions(HOST + ':' + str(PORT))
+    try:
+        async for note in sessions.spectate(room_id, delay):
+            if not note.HasField("roster"):
+                print_note(note)
+        print("ROOM CLOSED")
+    except grpc.aio.AioRpcError as e:
+        print(e.details())
+    finally:
+        await sessions.close()
+
 
-    def __init__(self, nickname: str):
-        self.nickname = nickname
-        channel = grpc.insecure_channel(HOST + ':' + str(PORT))
-        self.conn = rpc.ChatServerStub(channel)
-        self.id = self.conn.Connect(chat.Connection(nickname=nickname)).member_id
-        threading.Thread(target=self.listen_for_messages, daemon=True).start()
-        self.write()
+class Client(Session):
 
-    def message_handler(self, note):
-        if self.id == note.member_id or (note.to and self.id not in note.to):
-            return
-        if note.name:
-            print(f"{note.name}: {note.message}")
-        else:
-            print(f"{note.message}")
+    def on_note(self, note):
+        if not note.HasField("roster"):
+            print_note(note)
 
-    def listen_for_messages(self):
-        for note in self.conn.ChatStream(chat.Empty()):
-            self.message_handler(note)
+    def on_gap(self):
+        print("CONNECTION RESTORED, SOME MESSAGES WERE LOST")
 
-    def write(self):
+    def on_limited(self, details):
+        print(details)
+
+    async def write(self):
+        loop = asyncio.get_running_loop()
         while True:
-            message = input()
-            if message:
-                n = chat.Note(
-                    name=self.nickname, member_id=self.id, message=message
-                )
-                self.conn.SendNote(n)
-                if message == client_commands.LEAVE:
-                    break
+            # input() blocks, so it waits in an executor thread while the
+            # loop goes on printing the stream
+            message = await loop.run_in_executor(None, input)
+            if not message:
+                continue
+            try:
+                note = self.note(message)
+            except ValueError:
+                print("INCORRECT VICTIM ID")
+                continue
+            if note.command == chat.MEMBERS:
+                print(self.roster.render(self.id))
+                continue
+            self.post(note)
+            if note.command == chat.LEAVE:
+                return
+
+
+async def play(nickname, room_id=None):
+    sessions = Sessions(HOST + ':' + str(PORT))
+    try:
+        client = Client(sessions, nickname)
+        await client.connect(room_id)
+        print(f"ROOM {client.room_id}")
+        reader = asyncio.create_task(client.run())
+        await client.write()
+        # The server ends the stream once it has handled the leave
+        await reader
+    finally:
+        await sessions.close()
 
 
 if __name__ == '__main__':
-    nickname = input("Enter your nickname:\n")
-    c = Client(nickname)
+    nickname = input("Enter your nickname (leave empty to watch a room):\n")
+    if not nickname:
+        room = int(input("Enter room id:\n"))
+        try:
+            delay = float(input("Enter delay in seconds (leave empty to watch live):\n"))
+        except ValueError:
+            delay = 0
+        asyncio.run(spectate(room, delay))
+    else:
+        try:
+            room = int(input("Enter room id (leave empty to join any room):\n"))
+        except ValueError:
+            room = None
+        asyncio.run(play(nickname, room))
@@ -1,3 +1,6 @@
+import proto.chat_pb2 as chat
+
+
 class ClientCommands:
     LEAVE = "/leave"
     MEMBERS = "/members"
@@ -24,3 +27,35 @@ class ClientCommands:
 
 
 client_commands = ClientCommands()
+
+COMMANDS = {
+    client_commands.LEAVE: chat.LEAVE,
+    client_commands.MEMBERS: chat.MEMBERS,
+    client_commands.VERIFY: chat.VERIFY,
+    client_commands.KILL: chat.KILL,
+    client_commands.EXECUTE: chat.EXECUTE,
+    client_commands.SKIP: chat.SKIP,
+    client_commands.SELF: chat.SELF,
+    client_commands.HELP: chat.HELP,
+    client_commands.READY: chat.READY,
+}
+TARGETED = {chat.VERIFY, chat.KILL, chat.EXECUTE}
+# Targets travel as int32 member ids
+MAX_TARGET = 2 ** 31 - 1
+
+
+def parse_command(message):
+    # Returns (command, target); raises ValueError for a missing, non-numeric
+    # or out of range target
+    parts = message.split()
+    command = COMMANDS.get(parts[0]) if parts else None
+    if command is None:
+        return chat.CHAT, None
+    if command not in TARGETED:
+        return command, None
+    if len(parts) < 2:
+        raise ValueError("missing target")
+    target = int(parts[1])
+    if not -MAX_TARGET - 1 <= target <= MAX_TARGET:
+        raise ValueError("target out of range")
+    return command, target
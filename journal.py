@@ -0,0 +1,137 @@
+import asyncio
+import os
+import struct
+import time
+import zlib
+
+import proto.chat_pb2 as chat
+
+from metrics import metrics
+
+# Every record is its length and CRC32 followed by an encoded Event
+HEADER = struct.Struct("<II")
+
+
+def encode(events):
+    records = []
+    for event in events:
+        data = event.SerializeToString()
+        records.append(HEADER.pack(len(data), zlib.crc32(data)))
+        records.append(data)
+    return b"".join(records)
+
+
+def read_events(path):
+    # Stops at the first torn or corrupt record, which is where a crash cut
+    # the last write short
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    events = []
+    pos = 0
+    while pos + HEADER.size <= len(data):
+        size, crc = HEADER.unpack_from(data, pos)
+        record = data[pos + HEADER.size:pos + HEADER.size + size]
+        if len(record) < size or zlib.crc32(record) != crc:
+            break
+        events.append(chat.Event.FromString(record))
+        pos += HEADER.size + size
+    return events
+
+
+class Journal:
+    # Append-only file of game events next to a snapshot of every room. Both
+    # start with a generation number: a journal only extends the snapshot of
+    # the same generation, so a crash halfway through replacing them never
+    # replays an event twice.
+    #
+    # record() only queues. One writer task turns whatever was queued while
+    # the previous write was in flight into a single write and fsync (group
+    # commit), so handlers never wait for the disk.
+
+    def __init__(self, path, snapshot_every=10000, fsync=True):
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        # Returns the events that rebuild the current state
+        self.source = None
+        self._generation = 0
+        self._file = None
+        self._pending = []
+        self._snapshot = None
+        self._since_snapshot = 0
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def load(self):
+        snapshot = read_events(self.snapshot_path)
+        journal = read_events(self.path)
+        self._generation = snapshot[0].seq if snapshot else 0
+        events = snapshot[1:]
+        if journal and journal[0].seq == self._generation:
+            events += journal[1:]
+        return events
+
+    def open(self, snapshot):
+        # Starts a new generation from the recovered state before serving
+        self._write(snapshot, [])
+        self._task = asyncio.create_task(self._run())
+
+    def record(self, event):
+        self._pending.append(event)
+        self._wake.set()
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every and self.source is not None:
+            self._since_snapshot = 0
+            # Taken once the current handler is done, so the state is whole
+            asyncio.get_running_loop().call_soon(self.snapshot)
+
+    def snapshot(self):
+        # Everything queued so far is part of the state being captured
+        self._pending = []
+        self._snapshot = self.source()
+        self._wake.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            snapshot, self._snapshot = self._snapshot, None
+            batch, self._pending = self._pending, []
+            t = time.perf_counter()
+            await loop.run_in_executor(None, self._write, snapshot, batch)
+            metrics.observe("journal_write", time.perf_counter() - t)
+            metrics.inc("journal_batches")
+            metrics.inc("journal_events", len(batch))
+
+    def _write(self, snapshot, batch):
+        if snapshot is not None:
+            self._generation += 1
+            header = chat.Event(type=chat.EVENT_GENERATION, seq=self._generation)
+            self._replace(self.snapshot_path, [header] + snapshot)
+            if self._file is not None:
+                self._file.close()
+            self._replace(self.path, [header])
+            self._file = open(self.path, "ab")
+            metrics.inc("journal_snapshots")
+        if batch:
+            self._file.write(encode(batch))
+            self._sync(self._file)
+
+    def _replace(self, path, events):
+        with open(path + ".tmp", "wb") as f:
+            f.write(encode(events))
+            self._sync(f)
+        os.replace(path + ".tmp", path)
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
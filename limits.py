@@ -0,0 +1,46 @@
+import time
+
+from chatlog import ChatLog
+
+
+class RateLimited(Exception):
+    pass
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._stamp = time.monotonic()
+
+    def take(self):
+        # Refilled lazily, so idle buckets cost nothing
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class Limits:
+    # Notes per second a member and a whole room may send, and how far a
+    # stream may fall behind its room before the overflow policy applies
+
+    def __init__(self, member_rate=5, member_burst=20, room_rate=50, room_burst=100,
+                 max_lag=1000, overflow=ChatLog.SKIP):
+        self.member_rate = member_rate
+        self.member_burst = member_burst
+        self.room_rate = room_rate
+        self.room_burst = room_burst
+        self.max_lag = max_lag
+        self.overflow = overflow
+
+    def member_bucket(self):
+        return TokenBucket(self.member_rate, self.member_burst)
+
+    def room_bucket(self):
+        return TokenBucket(self.room_rate, self.room_burst)
@@ -0,0 +1,165 @@
+import itertools
+
+import rules
+
+
+class Member:
+    # Slotted, with role and status kept as codes from rules.py, since a
+    # node holds one of these for every player it serves
+    __slots__ = ("_nickname", "_member_id", "_role", "_status", "_registry", "_seat")
+
+    # Servers hand out ids through Router.ids; this counter only serves
+    # members made without one, e.g. in benchmarks and tests
+    _ids = itertools.count(1)
+
+    def __init__(self, nickname, member_id=None):
+        self._nickname = nickname
+        # Recovered members keep the id they were given before a restart
+        self._member_id = next(Member._ids) if member_id is None else member_id
+        self._status = 0
+        self._role = 0
+        self._registry = None
+        self._seat = None
+
+    def prepare(self, role):
+        self._update(rules.ROLE_CODES[role], rules.STATUS_CODES[rules.ALIVE])
+
+    def dead(self):
+        self._update(rules.ROLE_CODES[rules.SPIRIT], rules.STATUS_CODES[rules.DEAD])
+
+    def _update(self, role, status):
+        if self._registry is not None:
+            self._registry.unindex(self)
+        self._role = role
+        self._status = status
+        if self._registry is not None:
+            self._registry.index(self)
+
+    @property
+    def nickname(self):
+        return self._nickname
+
+    @property
+    def member_id(self):
+        return self._member_id
+
+    @property
+    def role(self):
+        return rules.ROLES[self._role]
+
+    @property
+    def status(self):
+        return rules.STATUSES[self._status]
+
+    @property
+    def seat(self):
+        return self._seat
+
+
+class MemberRegistry:
+    # Members of one room, each in a numbered seat that is reused after a
+    # member leaves, so per-member game state such as votes fits in arrays.
+    # Member ids are also indexed by role, by status and by both; the
+    # indexes change with every join, leave and role change, and recipient
+    # sets are cached per index key until it changes, so routing a chat
+    # line does not depend on the size of the room.
+
+    def __init__(self):
+        self._members = {}
+        self._seats = []
+        self._free = []
+        self._index = {}
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, member_id):
+        return member_id in self._members
+
+    def __getitem__(self, member_id):
+        return self._members[member_id]
+
+    def __iter__(self):
+        return iter(self._members)
+
+    def get(self, member_id):
+        return self._members.get(member_id)
+
+    def values(self):
+        return self._members.values()
+
+    @property
+    def seats(self):
+        # Seats ever taken, free ones included
+        return len(self._seats)
+
+    def at(self, seat):
+        return self._seats[seat]
+
+    def add(self, member):
+        if self._free:
+            member._seat = self._free.pop()
+            self._seats[member._seat] = member
+        else:
+            member._seat = len(self._seats)
+            self._seats.append(member)
+        self._members[member.member_id] = member
+        member._registry = self
+        self.index(member)
+
+    def remove(self, member_id):
+        member = self._members.pop(member_id)
+        self._seats[member._seat] = None
+        self._free.append(member._seat)
+        self.unindex(member)
+        member._registry = None
+        member._seat = None
+        return member
+
+    def index(self, member):
+        for key in self._keys(member._role, member._status):
+            ids = self._index.get(key)
+            if ids is None:
+                ids = self._index[key] = set()
+            ids.add(member._member_id)
+            self._cache.pop(key, None)
+
+    def unindex(self, member):
+        for key in self._keys(member._role, member._status):
+            ids = self._index[key]
+            ids.discard(member._member_id)
+            if not ids:
+                del self._index[key]
+            self._cache.pop(key, None)
+
+    def with_role(self, role):
+        return self._lookup(self._key(role, None))
+
+    def with_status(self, status):
+        return self._lookup(self._key(None, status))
+
+    def with_role_status(self, role, status):
+        return self._lookup(self._key(role, status))
+
+    def count(self, role=None, status=None):
+        # Read from the index itself, without copying it into a set
+        return len(self._index.get(self._key(role, status), ()))
+
+    def _lookup(self, key):
+        ids = self._cache.get(key)
+        if ids is None:
+            ids = self._cache[key] = frozenset(self._index.get(key, ()))
+        return ids
+
+    @staticmethod
+    def _key(role, status):
+        if status is None:
+            return "role", rules.ROLE_CODES[role]
+        if role is None:
+            return "status", rules.STATUS_CODES[status]
+        return "role_status", rules.ROLE_CODES[role], rules.STATUS_CODES[status]
+
+    @staticmethod
+    def _keys(role, status):
+        return ("role", role), ("status", status), ("role_status", role, status)
@@ -0,0 +1,122 @@
+from collections import Counter, defaultdict
+import bisect
+import sys
+import time
+import traceback
+
+import grpc
+
+import proto.chat_pb2 as chat
+import proto.chat_pb2_grpc as rpc
+
+
+class Histogram:
+    # Log-scale buckets from 10us to ~40s; observing is a bisect and an
+    # increment, and quantiles are read back from the bucket bounds.
+    BOUNDS = [1e-5 * 2 ** i for i in range(23)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.BOUNDS[min(i, len(self.BOUNDS) - 1)]
+        return self.BOUNDS[-1]
+
+
+class Timer:
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Metrics:
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counters = Counter()
+        self.histograms = defaultdict(Histogram)
+        self._last_render = (self.started, Counter())
+
+    def inc(self, name, n=1):
+        self.counters[name] += n
+
+    def observe(self, name, seconds):
+        self.histograms[name].observe(seconds)
+
+    def timer(self, name):
+        return Timer(self.histograms[name])
+
+    def render(self, gauges=None):
+        now = time.monotonic()
+        last_time, last_counters = self._last_render
+        elapsed = max(now - last_time, 1e-9)
+        lines = [f"uptime_seconds {now - self.started:.1f}"]
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"{name} {value}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name}_total {value}")
+            # Rate since the previous scrape
+            lines.append(f"{name}_per_second {(value - last_counters[name]) / elapsed:.1f}")
+        for name, h in sorted(self.histograms.items()):
+            lines.append(f"{name}_seconds_count {h.count}")
+            lines.append(f"{name}_seconds_sum {h.sum:.6f}")
+            for q in (0.5, 0.99):
+                lines.append(f'{name}_seconds{{quantile="{q}"}} {h.quantile(q):.6f}')
+        self._last_render = (now, Counter(self.counters))
+        return "\n".join(lines) + "\n"
+
+
+def sample_stacks(thread_id, seconds, interval=0.005, top=15):
+    # Poor man's sampling profiler: snapshot one thread's stack every
+    # interval and count identical stacks. Runs in its own thread, so the
+    # sampled event loop keeps serving while it works.
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stack = tuple(
+                f"{f.filename.rsplit('/', 1)[-1]}:{f.lineno} {f.name}"
+                for f in traceback.extract_stack(frame)[-8:]
+            )
+            stacks[stack] += 1
+        time.sleep(interval)
+    total = sum(stacks.values()) or 1
+    lines = [f"{total} samples over {seconds:.1f}s"]
+    for stack, n in stacks.most_common(top):
+        lines.append(f"\n{100 * n / total:.1f}% ({n})")
+        lines.extend(f"    {entry}" for entry in stack)
+    return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+if __name__ == '__main__':
+    target = sys.argv[1] if len(sys.argv) > 1 else "localhost:5000"
+    profile = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    stub = rpc.ChatServerStub(grpc.insecure_channel(target))
+    reply = stub.Stats(chat.StatsRequest(profile_seconds=profile))
+    print(reply.metrics)
+    if reply.profile:
+        print(reply.profile)
@@ -2,6 +2,7 @@
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
 # source: chat.proto
 """Generated protocol buffer code."""
+from google.protobuf.internal import enum_type_wrapper
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import descriptor_pool as _descriptor_pool
 from google.protobuf import message as _message
@@ -14,14 +15,50 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nchat.proto\x12\x04grpc\"\x07\n\x05\x45mpty\"e\n\x04Note\x12\x16\n\tmember_id\x18\x01 \x01(\x05H\x00\x88\x01\x01\x12\x11\n\x04name\x18\x02 \x01(\tH\x01\x88\x01\x01\x12\x0f\n\x07message\x18\x03 \x01(\t\x12\n\n\x02to\x18\x04 \x03(\x05\x42\x0c\n\n_member_idB\x07\n\x05_name\"\x1e\n\nConnection\x12\x10\n\x08nickname\x18\x01 \x01(\t\"$\n\x0f\x43onnectionReply\x12\x11\n\tmember_id\x18\x01 \x01(\x05\x32\x8e\x01\n\nChatServer\x12\'\n\nChatStream\x12\x0b.grpc.Empty\x1a\n.grpc.Note0\x01\x12#\n\x08SendNote\x12\n.grpc.Note\x1a\x0b.grpc.Empty\x12\x32\n\x07\x43onnect\x12\x10.grpc.Connection\x1a\x15.grpc.ConnectionReplyb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nchat.proto\x12\x04grpc\"\x07\n\x05\x45mpty\"]\n\rStreamRequest\x12\x11\n\tmember_id\x18\x01 \x01(\x05\x12\x0f\n\x07room_id\x18\x02 \x01(\x05\x12\x18\n\x0bresume_from\x18\x03 \x01(\x03H\x00\x88\x01\x01\x42\x0e\n\x0c_resume_from\"\xd0\x01\n\x04Note\x12\x16\n\tmember_id\x18\x01 \x01(\x05H\x00\x88\x01\x01\x12\x11\n\x04name\x18\x02 \x01(\tH\x01\x88\x01\x01\x12\x0f\n\x07message\x18\x03 \x01(\t\x12\n\n\x02to\x18\x04 \x03(\x05\x12\x1e\n\x07\x63ommand\x18\x05 \x01(\x0e\x32\r.grpc.Command\x12\x13\n\x06target\x18\x06 \x01(\x05H\x02\x88\x01\x01\x12\x0b\n\x03seq\x18\x07 \x01(\x03\x12\x1c\n\x06roster\x18\x08 \x01(\x0b\x32\x0c.grpc.RosterB\x0c\n\n_member_idB\x07\n\x05_nameB\t\n\x07_target\"L\n\x0bRosterEntry\x12\x11\n\tmember_id\x18\x01 \x01(\x05\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x0c\n\x04role\x18\x03 \x01(\t\x12\x0e\n\x06status\x18\x04 \x01(\t\"j\n\x06Roster\x12\x0c\n\x04\x66ull\x18\x01 \x01(\x08\x12\"\n\x07members\x18\x02 \x03(\x0b\x32\x11.grpc.RosterEntry\x12\x0c\n\x04left\x18\x03 \x03(\x05\x12\x14\n\x07running\x18\x04 \x01(\x08H\x00\x88\x01\x01\x42\n\n\x08_running\"@\n\nConnection\x12\x10\n\x08nickname\x18\x01 \x01(\t\x12\x14\n\x07room_id\x18\x02 \x01(\x05H\x00\x88\x01\x01\x42\n\n\x08_room_id\"S\n\x0f\x43onnectionReply\x12\x11\n\tmember_id\x18\x01 \x01(\x05\x12\x0f\n\x07room_id\x18\x02 \x01(\x05\x12\x1c\n\x06roster\x18\x03 \x01(\x0b\x32\x0c.grpc.Roster\"\xb1\x01\n\x05\x45vent\x12\x1d\n\x04type\x18\x01 \x01(\x0e\x32\x0f.grpc.EventType\x12\x0f\n\x07room_id\x18\x02 \x01(\x05\x12\x11\n\tmember_id\x18\x03 \x01(\x05\x12\x13\n\x06target\x18\x04 \x01(\x05H\x00\x88\x01\x01\x12\x0c\n\x04text\x18\x05 \x01(\t\x12\r\n\x05\x66rame\x18\x06 \x01(\x0c\x12\n\n\x02to\x18\x07 \x03(\x05\x12\x0f\n\x07private\x18\x08 \x01(\x08\x12\x0b\n\x03seq\x18\t \x01(\x03\x42\t\n\x07_target\"H\n\x0fSpectateRequest\x12\x0f\n\x07room_id\x18\x01 \x01(\x03\x12\x15\n\rdelay_seconds\x18\x02 \x01(\x01\x12\r\n\x05relay\x18\x03 \x01(\x08\"\'\n\x0cStatsRequest\x12\x17\n\x0fprofile_seconds\x18\x01 \x01(\x01\".\n\nStatsReply\x12\x0f\n\x07metrics\x18\x01 \x01(\t\x12\x0f\n\x07profile\x18\x02 \x01(\t*w\n\x07\x43ommand\x12\x08\n\x04\x43HAT\x10\x00\x12\t\n\x05LEAVE\x10\x01\x12\x0b\n\x07MEMBERS\x10\x02\x12\n\n\x06VERIFY\x10\x03\x12\x08\n\x04KILL\x10\x04\x12\x0b\n\x07\x45XECUTE\x10\x05\x12\x08\n\x04SKIP\x10\x06\x12\x08\n\x04SELF\x10\x07\x12\x08\n\x04HELP\x10\x08\x12\t\n\x05READY\x10\t*\xe2\x01\n\tEventType\x12\x14\n\x10\x45VENT_GENERATION\x10\x00\x12\x0e\n\nEVENT_ROOM\x10\x01\x12\x0e\n\nEVENT_JOIN\x10\x02\x12\x0f\n\x0b\x45VENT_LEAVE\x10\x03\x12\x0f\n\x0b\x45VENT_READY\x10\x04\x12\x0f\n\x0b\x45VENT_START\x10\x05\x12\x0e\n\nEVENT_DEAL\x10\x06\x12\x0e\n\nEVENT_STEP\x10\x07\x12\x0e\n\nEVENT_VOTE\x10\x08\x12\x0e\n\nEVENT_DEAD\x10\t\x12\r\n\tEVENT_END\x10\n\x12\x0e\n\nEVENT_NOTE\x10\x0b\x12\r\n\tEVENT_LOG\x10\x0c\x32\x9e\x02\n\nChatServer\x12/\n\nChatStream\x12\x13.grpc.StreamRequest\x1a\n.grpc.Note0\x01\x12#\n\x08SendNote\x12\n.grpc.Note\x1a\x0b.grpc.Empty\x12&\n\tSendNotes\x12\n.grpc.Note\x1a\x0b.grpc.Empty(\x01\x12\x32\n\x07\x43onnect\x12\x10.grpc.Connection\x1a\x15.grpc.ConnectionReply\x12-\n\x05Stats\x12\x12.grpc.StatsRequest\x1a\x10.grpc.StatsReply\x12/\n\x08Spectate\x12\x15.grpc.SpectateRequest\x1a\n.grpc.Note0\x01\x62\x06proto3')
+
+_COMMAND = DESCRIPTOR.enum_types_by_name['Command']
+Command = enum_type_wrapper.EnumTypeWrapper(_COMMAND)
+
+_EVENTTYPE = DESCRIPTOR.enum_types_by_name['EventType']
+EventType = enum_type_wrapper.EnumTypeWrapper(_EVENTTYPE)
+CHAT = 0
+LEAVE = 1
+MEMBERS = 2
+VERIFY = 3
+KILL = 4
+EXECUTE = 5
+SKIP = 6
+SELF = 7
+HELP = 8
+READY = 9
+EVENT_GENERATION = 0
+EVENT_ROOM = 1
+EVENT_JOIN = 2
+EVENT_LEAVE = 3
+EVENT_READY = 4
+EVENT_START = 5
+EVENT_DEAL = 6
+EVENT_STEP = 7
+EVENT_VOTE = 8
+EVENT_DEAD = 9
+EVENT_END = 10
+EVENT_NOTE = 11
+EVENT_LOG = 12
 
 
 
 _EMPTY = DESCRIPTOR.message_types_by_name['Empty']
+_STREAMREQUEST = DESCRIPTOR.message_types_by_name['StreamRequest']
 _NOTE = DESCRIPTOR.message_types_by_name['Note']
+_ROSTERENTRY = DESCRIPTOR.message_types_by_name['RosterEntry']
+_ROSTER = DESCRIPTOR.message_types_by_name['Roster']
 _CONNECTION = DESCRIPTOR.message_types_by_name['Connection']
 _CONNECTIONREPLY = DESCRIPTOR.message_types_by_name['ConnectionReply']
+_EVENT = DESCRIPTOR.message_types_by_name['Event']
+_SPECTATEREQUEST = DESCRIPTOR.message_types_by_name['SpectateRequest']
+_STATSREQUEST = DESCRIPTOR.message_types_by_name['StatsRequest']
+_STATSREPLY = DESCRIPTOR.message_types_by_name['StatsReply']
 Empty = _reflection.GeneratedProtocolMessageType('Empty', (_message.Message,), {
   'DESCRIPTOR' : _EMPTY,
   '__module__' : 'chat_pb2'
@@ -29,6 +66,13 @@ Empty = _reflection.GeneratedProtocolMessageType('Empty', (_message.Message,), {
   })
 _sym_db.RegisterMessage(Empty)
 
+StreamRequest = _reflection.GeneratedProtocolMessageType('StreamRequest', (_message.Message,), {
+  'DESCRIPTOR' : _STREAMREQUEST,
+  '__module__' : 'chat_pb2'
+  # @@protoc_insertion_point(class_scope:grpc.StreamRequest)
+  })
+_sym_db.RegisterMessage(StreamRequest)
+
 Note = _reflection.GeneratedProtocolMessageType('Note', (_message.Message,), {
   'DESCRIPTOR' : _NOTE,
   '__module__' : 'chat_pb2'
@@ -36,6 +80,20 @@ Note = _reflection.GeneratedProtocolMessageType('Note', (_message.Message,), {
   })
 _sym_db.RegisterMessage(Note)
 
+RosterEntry = _reflection.GeneratedProtocolMessageType('RosterEntry', (_message.Message,), {
+  'DESCRIPTOR' : _ROSTERENTRY,
+  '__module__' : 'chat_pb2'
+  # @@protoc_insertion_point(class_scope:grpc.RosterEntry)
+  })
+_sym_db.RegisterMessage(RosterEntry)
+
+Roster = _reflection.GeneratedProtocolMessageType('Roster', (_message.Message,), {
+  'DESCRIPTOR' : _ROSTER,
+  '__module__' : 'chat_pb2'
+  # @@protoc_insertion_point(class_scope:grpc.Roster)
+  })
+_sym_db.RegisterMessage(Roster)
+
 Connection = _reflection.GeneratedProtocolMessageType('Connection', (_message.Message,), {
   'DESCRIPTOR' : _CONNECTION,
   '__module__' : 'chat_pb2'
@@ -50,18 +108,64 @@ ConnectionReply = _reflection.GeneratedProtocolMessageType('ConnectionReply', (_
   })
 _sym_db.RegisterMessage(ConnectionReply)
 
+Event = _reflection.GeneratedProtocolMessageType('Event', (_message.Message,), {
+  'DESCRIPTOR' : _EVENT,
+  '__module__' : 'chat_pb2'
+  # @@protoc_insertion_point(class_scope:grpc.Event)
+  })
+_sym_db.RegisterMessage(Event)
+
+SpectateRequest = _reflection.GeneratedProtocolMessageType('SpectateRequest', (_message.Message,), {
+  'DESCRIPTOR' : _SPECTATEREQUEST,
+  '__module__' : 'chat_pb2'
+  # @@protoc_insertion_point(class_scope:grpc.SpectateRequest)
+  })
+_sym_db.RegisterMessage(SpectateRequest)
+
+StatsRequest = _reflection.GeneratedProtocolMessageType('StatsRequest', (_message.Message,), {
+  'DESCRIPTOR' : _STATSREQUEST,
+  '__module__' : 'chat_pb2'
+  # @@protoc_insertion_point(class_scope:grpc.StatsRequest)
+  })
+_sym_db.RegisterMessage(StatsRequest)
+
+StatsReply = _reflection.GeneratedProtocolMessageType('StatsReply', (_message.Message,), {
+  'DESCRIPTOR' : _STATSREPLY,
+  '__module__' : 'chat_pb2'
+  # @@protoc_insertion_point(class_scope:grpc.StatsReply)
+  })
+_sym_db.RegisterMessage(StatsReply)
+
 _CHATSERVER = DESCRIPTOR.services_by_name['ChatServer']
 if _descriptor._USE_C_DESCRIPTORS == False:
 
   DESCRIPTOR._options = None
+  _COMMAND._serialized_start=1015
+  _COMMAND._serialized_end=1134
+  _EVENTTYPE._serialized_start=1137
+  _EVENTTYPE._serialized_end=1363
   _EMPTY._serialized_start=20
   _EMPTY._serialized_end=27
-  _NOTE._serialized_start=29
-  _NOTE._serialized_end=130
-  _CONNECTION._serialized_start=132
-  _CONNECTION._serialized_end=162
-  _CONNECTIONREPLY._serialized_start=164
-  _CONNECTIONREPLY._serialized_end=200
-  _CHATSERVER._serialized_start=203
-  _CHATSERVER._serialized_end=345
+  _STREAMREQUEST._serialized_start=29
+  _STREAMREQUEST._serialized_end=122
+  _NOTE._serialized_start=125
+  _NOTE._serialized_end=333
+  _ROSTERENTRY._serialized_start=335
+  _ROSTERENTRY._serialized_end=411
+  _ROSTER._serialized_start=413
+  _ROSTER._serialized_end=519
+  _CONNECTION._serialized_start=521
+  _CONNECTION._serialized_end=585
+  _CONNECTIONREPLY._serialized_start=587
+  _CONNECTIONREPLY._serialized_end=670
+  _EVENT._serialized_start=673
+  _EVENT._serialized_end=850
+  _SPECTATEREQUEST._serialized_start=852
+  _SPECTATEREQUEST._serialized_end=924
+  _STATSREQUEST._serialized_start=926
+  _STATSREQUEST._serialized_end=965
+  _STATSREPLY._serialized_start=967
+  _STATSREPLY._serialized_end=1013
+  _CHATSERVER._serialized_start=1366
+  _CHATSERVER._serialized_end=1652
 # @@protoc_insertion_point(module_scope)
@@ -16,7 +16,7 @@ class ChatServerStub(object):
         """
         self.ChatStream = channel.unary_stream(
                 '/grpc.ChatServer/ChatStream',
-                request_serializer=chat__pb2.Empty.SerializeToString,
+                request_serializer=chat__pb2.StreamRequest.SerializeToString,
                 response_deserializer=chat__pb2.Note.FromString,
                 )
         self.SendNote = channel.unary_unary(
@@ -24,11 +24,26 @@ class ChatServerStub(object):
                 request_serializer=chat__pb2.Note.SerializeToString,
                 response_deserializer=chat__pb2.Empty.FromString,
                 )
+        self.SendNotes = channel.stream_unary(
+                '/grpc.ChatServer/SendNotes',
+                request_serializer=chat__pb2.Note.SerializeToString,
+                response_deserializer=chat__pb2.Empty.FromString,
+                )
         self.Connect = channel.unary_unary(
                 '/grpc.ChatServer/Connect',
                 request_serializer=chat__pb2.Connection.SerializeToString,
                 response_deserializer=chat__pb2.ConnectionReply.FromString,
                 )
+        self.Stats = channel.unary_unary(
+                '/grpc.ChatServer/Stats',
+                request_serializer=chat__pb2.StatsRequest.SerializeToString,
+                response_deserializer=chat__pb2.StatsReply.FromString,
+                )
+        self.Spectate = channel.unary_stream(
+                '/grpc.ChatServer/Spectate',
+                request_serializer=chat__pb2.SpectateRequest.SerializeToString,
+                response_deserializer=chat__pb2.Note.FromString,
+                )
 
 
 class ChatServerServicer(object):
@@ -47,18 +62,38 @@ class ChatServerServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def SendNotes(self, request_iterator, context):
+        """Keeps one upstream open per client; Notes are handled in the order they arrive
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def Connect(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def Stats(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Spectate(self, request, context):
+        """Read-only stream of a room's public Notes, without taking a seat
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_ChatServerServicer_to_server(servicer, server):
     rpc_method_handlers = {
             'ChatStream': grpc.unary_stream_rpc_method_handler(
                     servicer.ChatStream,
-                    request_deserializer=chat__pb2.Empty.FromString,
+                    request_deserializer=chat__pb2.StreamRequest.FromString,
                     response_serializer=chat__pb2.Note.SerializeToString,
             ),
             'SendNote': grpc.unary_unary_rpc_method_handler(
@@ -66,11 +101,26 @@ def add_ChatServerServicer_to_server(servicer, server):
                     request_deserializer=chat__pb2.Note.FromString,
                     response_serializer=chat__pb2.Empty.SerializeToString,
             ),
+            'SendNotes': grpc.stream_unary_rpc_method_handler(
+                    servicer.SendNotes,
+                    request_deserializer=chat__pb2.Note.FromString,
+                    response_serializer=chat__pb2.Empty.SerializeToString,
+            ),
             'Connect': grpc.unary_unary_rpc_method_handler(
                     servicer.Connect,
                     request_deserializer=chat__pb2.Connection.FromString,
                     response_serializer=chat__pb2.ConnectionReply.SerializeToString,
             ),
+            'Stats': grpc.unary_unary_rpc_method_handler(
+                    servicer.Stats,
+                    request_deserializer=chat__pb2.StatsRequest.FromString,
+                    response_serializer=chat__pb2.StatsReply.SerializeToString,
+            ),
+            'Spectate': grpc.unary_stream_rpc_method_handler(
+                    servicer.Spectate,
+                    request_deserializer=chat__pb2.SpectateRequest.FromString,
+                    response_serializer=chat__pb2.Note.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'grpc.ChatServer', rpc_method_handlers)
@@ -93,7 +143,7 @@ class ChatServer(object):
             timeout=None,
             metadata=None):
         return grpc.experimental.unary_stream(request, target, '/grpc.ChatServer/ChatStream',
-            chat__pb2.Empty.SerializeToString,
+            chat__pb2.StreamRequest.SerializeToString,
             chat__pb2.Note.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
@@ -115,6 +165,23 @@ class ChatServer(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def SendNotes(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(request_iterator, target, '/grpc.ChatServer/SendNotes',
+            chat__pb2.Note.SerializeToString,
+            chat__pb2.Empty.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def Connect(request,
             target,
@@ -131,3 +198,37 @@ class ChatServer(object):
             chat__pb2.ConnectionReply.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def Stats(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/grpc.ChatServer/Stats',
+            chat__pb2.StatsRequest.SerializeToString,
+            chat__pb2.StatsReply.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def Spectate(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/grpc.ChatServer/Spectate',
+            chat__pb2.SpectateRequest.SerializeToString,
+            chat__pb2.Note.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
@@ -0,0 +1,93 @@
+import asyncio
+import sys
+
+import grpc
+import proto.chat_pb2 as chat
+
+from broadcast import Broadcast
+from metrics import metrics
+from server import SERVER_OPTIONS
+from sessions import CHANNEL_OPTIONS, redirect_target
+
+
+class Relay:
+    # Second tier of the spectator fan-out: one Spectate stream per watched
+    # room from the node that owns it, passed on as the same frames to any
+    # number of spectators, so their writes load this process and not the
+    # game's. A relay may also take its rooms from another relay.
+
+    def __init__(self, origin):
+        self.origin = origin
+        self._channels = {}
+        # room_id -> Broadcast, and the task feeding it
+        self._rooms = {}
+        self._feeds = {}
+        self._spectators = 0
+
+    def spectate(self, address):
+        # Frames are passed on as they came, without decoding them
+        channel = self._channels.get(address)
+        if channel is None:
+            channel = self._channels[address] = grpc.aio.insecure_channel(address, options=CHANNEL_OPTIONS)
+        return channel.unary_stream(
+            '/grpc.ChatServer/Spectate', request_serializer=chat.SpectateRequest.SerializeToString
+        )
+
+    async def Spectate(self, request: chat.SpectateRequest, context):
+        room = self._rooms.get(request.room_id)
+        if room is None:
+            room = self._rooms[request.room_id] = Broadcast()
+            self._feeds[request.room_id] = asyncio.create_task(self.feed(request.room_id, room))
+        metrics.inc("spectators_joined")
+        self._spectators += 1
+        try:
+            async for frames in room.watch(request.delay_seconds):
+                for frame in frames:
+                    yield frame
+                metrics.inc("frames_spectated", len(frames))
+        finally:
+            self._spectators -= 1
+            if not room.spectators and self._rooms.get(request.room_id) is room:
+                # Nobody here watches the room any more
+                del self._rooms[request.room_id]
+                self._feeds.pop(request.room_id).cancel()
+
+    async def feed(self, room_id, room):
+        address = self.origin
+        try:
+            while True:
+                try:
+                    async for frame in self.spectate(address)(chat.SpectateRequest(room_id=room_id, relay=True)):
+                        room.append(frame)
+                    return
+                except grpc.aio.AioRpcError as e:
+                    # Rooms of other nodes are followed to their owner
+                    address = e.code() == grpc.StatusCode.UNAVAILABLE and redirect_target(e)
+                    if not address:
+                        return
+        finally:
+            # The room is gone or its node is; spectators get what is left
+            # and reconnect
+            room.close()
+            if self._rooms.get(room_id) is room:
+                del self._rooms[room_id]
+                del self._feeds[room_id]
+
+
+async def serve(port, origin):
+    server = grpc.aio.server(options=SERVER_OPTIONS)
+    relay = Relay(origin)
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler('grpc.ChatServer', {
+        'Spectate': grpc.unary_stream_rpc_method_handler(
+            relay.Spectate,
+            request_deserializer=chat.SpectateRequest.FromString,
+        ),
+    }),))
+    server.add_insecure_port('[::]:' + str(port))
+    await server.start()
+    await server.wait_for_termination()
+
+
+if __name__ == '__main__':
+    # python3 relay.py localhost:5000 5200
+    asyncio.run(serve(int(sys.argv[2]) if len(sys.argv) > 2 else 5200, sys.argv[1]))
@@ -0,0 +1,486 @@
+import asyncio
+
+import proto.chat_pb2 as chat
+
+import roster
+import rules
+from broadcast import Broadcast
+from chatlog import ChatLog
+from commands import client_commands, parse_command
+from limits import Limits, RateLimited
+from members import Member, MemberRegistry
+from metrics import metrics
+from votes import VoteLedger
+
+
+class Room:
+
+    def __init__(self, room_id, size, on_leave, scheduler, turn_seconds=15, pause_seconds=1, limits=None):
+        self._room_id = room_id
+        self._on_leave = on_leave
+        self._scheduler = scheduler
+        self.members = MemberRegistry()
+        self.limits = limits or Limits()
+        self.chats = ChatLog(self.limits.max_lag, self.limits.overflow)
+        self._bucket = self.limits.room_bucket()
+        self._buckets = {}
+        self.chats.listener = self.on_append
+        # Public notes again, for spectators
+        self.broadcast = Broadcast()
+        # Set by the server once the room is recovered or opened
+        self.journal = None
+        self.size = size
+        # Each player gets turn_seconds to act in a phase
+        self.turn_seconds = turn_seconds
+        self.pause_seconds = pause_seconds
+
+        # Game Section
+        self._game_running = False
+        self._votes = VoteLedger(self.members)
+        self._ready = set()
+        self._active_role = None
+        self._daytime = None
+        self._game = None
+        self._phase = None
+        # Turn of the round the game is in, and the mafia's victim until morning
+        self._step = None
+        self._marked = None
+
+    @property
+    def room_id(self):
+        return self._room_id
+
+    @property
+    def full(self):
+        return len(self.members) >= self.size
+
+    @property
+    def running(self):
+        return self._game_running
+
+    def join(self, m):
+        self.members.add(m)
+        self.chats.subscribe(m.member_id)
+        self.record(chat.EVENT_JOIN, member_id=m.member_id, text=m.nickname)
+        n = chat.Note(message=f"{m.nickname} joined!")
+        self.chats.append(n)
+        self.send_roster(chat.Roster(members=[roster.entry(m)]))
+        if len(self.members) == self.size:
+            self._game_running = True
+            self.record(chat.EVENT_START)
+            self._game = asyncio.create_task(self.start_game())
+
+    def record(self, event_type, **fields):
+        if self.journal is not None:
+            self.journal.record(chat.Event(type=event_type, room_id=self._room_id, **fields))
+
+    def on_append(self, frame, recipients, author):
+        if recipients is None:
+            self.broadcast.append(frame)
+        self.record(
+            chat.EVENT_NOTE, frame=frame, member_id=author,
+            private=recipients is not None, to=recipients or ()
+        )
+
+    def apply(self, event):
+        handler = self._replay.get(event.type)
+        if handler is not None:
+            handler(self, event)
+
+    def replay_join(self, event):
+        m = Member(event.text, event.member_id)
+        self.members.add(m)
+        self.chats.subscribe(m.member_id)
+        return m
+
+    def replay_start(self, event):
+        self._game_running = True
+        self._votes.clear()
+        self._step = None
+        self._marked = None
+
+    def replay_deal(self, event):
+        for member_id, role in zip(event.to, event.text.split(",")):
+            self.members[member_id].prepare(role)
+
+    def replay_step(self, event):
+        self._marked = event.target if event.HasField("target") else None
+        self.begin(event.text)
+
+    def replay_note(self, event):
+        self.chats.restore(event.frame, frozenset(event.to) if event.private else None, event.member_id)
+
+    def snapshot(self):
+        # The shortest list of events that rebuilds this room
+        room_id = self._room_id
+        events = [
+            chat.Event(type=chat.EVENT_ROOM, room_id=room_id),
+            chat.Event(type=chat.EVENT_LOG, room_id=room_id, seq=self.chats.offset),
+        ]
+        for frame, recipients, author in self.chats.entries():
+            events.append(chat.Event(
+                type=chat.EVENT_NOTE, room_id=room_id, frame=frame, member_id=author,
+                private=recipients is not None, to=recipients or ()
+            ))
+        members = list(self.members.values())
+        for m in members:
+            events.append(chat.Event(type=chat.EVENT_JOIN, room_id=room_id, member_id=m.member_id, text=m.nickname))
+        dealt = [m for m in members if m.role is not None]
+        if dealt:
+            events.append(chat.Event(
+                type=chat.EVENT_DEAL, room_id=room_id,
+                to=[m.member_id for m in dealt], text=",".join(m.role for m in dealt)
+            ))
+        for m in dealt:
+            if m.status == "dead":
+                events.append(chat.Event(type=chat.EVENT_DEAD, room_id=room_id, member_id=m.member_id))
+        for member_id in self._ready:
+            events.append(chat.Event(type=chat.EVENT_READY, room_id=room_id, member_id=member_id))
+        if self._game_running:
+            events.append(chat.Event(type=chat.EVENT_START, room_id=room_id))
+            if self._step is not None:
+                events.append(chat.Event(type=chat.EVENT_STEP, room_id=room_id, text=self._step, target=self._marked))
+            for voter, target in self._votes.ballots():
+                events.append(chat.Event(type=chat.EVENT_VOTE, room_id=room_id, member_id=voter, target=target))
+        return events
+
+    def resume(self):
+        # Called once a recovered room is rebuilt. Clients come back with
+        # the seq they last saw, so cursors start at the head.
+        for member_id in self.members:
+            self.chats.subscribe(member_id)
+        if self._game_running:
+            # A game that had not reached its first turn is dealt again
+            if self._step is None:
+                self._game = asyncio.create_task(self.start_game())
+            else:
+                self._game = asyncio.create_task(self.play(self._step))
+
+    def message_handler(self, note: chat.Note):
+        # Parsed before the limits, so a /leave sent as text is not throttled either
+        bad_target = False
+        if note.command == chat.CHAT and note.message.startswith("/"):
+            # Older clients send commands as plain text
+            try:
+                command, target = parse_command(note.message)
+                note.command = command
+                if target is not None:
+                    note.target = target
+            except ValueError:
+                bad_target = True
+        # Leaving is never limited, so a throttled client can always go
+        if note.command != chat.LEAVE:
+            bucket = self._buckets.get(note.member_id)
+            if bucket is None:
+                bucket = self._buckets[note.member_id] = self.limits.member_bucket()
+            if not bucket.take() or not self._bucket.take():
+                raise RateLimited()
+        if bad_target:
+            self.send_message("INCORRECT VICTIM ID", note.member_id)
+            return
+        handler = self._handlers.get(note.command)
+        if handler is not None:
+            handler(self, note)
+
+    def target(self, note):
+        if note.HasField("target") and note.target in self.members:
+            return self.members[note.target]
+        self.send_message("INCORRECT VICTIM ID", note.member_id)
+        return None
+
+    def on_members(self, note):
+        # Clients answer /members from their own roster; this resends it
+        # in full, e.g. after a stream lost notes
+        m = self.members[note.member_id]
+        self.send_roster(roster.snapshot(self.members.values(), self._game_running, m.status != "alive"), m.member_id)
+
+    def on_leave(self, note):
+        left_member = self.members.remove(note.member_id)
+        self._buckets.pop(left_member.member_id, None)
+        delta = chat.Roster(left=[left_member.member_id])
+        if self._game_running:
+            self._game.cancel()
+            self.set_default()
+            metrics.inc("games_stopped")
+            self.send_message("GAME STOPPED")
+            delta.running = False
+        self.send_message(f"{left_member.nickname} left")
+        self.send_roster(delta)
+        self.chats.unsubscribe(left_member.member_id)
+        self.record(chat.EVENT_LEAVE, member_id=left_member.member_id)
+        self._on_leave(self, left_member)
+
+    def on_help(self, note):
+        self.send_message(client_commands.COMMANDS_LIST, note.member_id)
+
+    def on_self(self, note):
+        if self._game_running:
+            self.send_message(f"YOU ARE {self.members[note.member_id].role}", note.member_id)
+
+    def on_ready(self, note):
+        if self._game_running:
+            return
+        if note.member_id not in self._ready:
+            self._ready.add(note.member_id)
+            self.record(chat.EVENT_READY, member_id=note.member_id)
+            self.send_message(f"{self.members[note.member_id].nickname} is ready to start game")
+
+    def on_kill(self, note):
+        if self._game_running:
+            member = self.members[note.member_id]
+            if member.role == self._active_role \
+                    and member.member_id not in self._votes \
+                    and member.status == "alive":
+                victim = self.target(note)
+                if victim is not None:
+                    self.vote(member.member_id, victim.member_id)
+                    self.send_message(
+                        f"{member.nickname} is voted for {victim.nickname}. {self.leader_text()}",
+                        self.members.with_role(member.role)
+                    )
+                    self.check_votes()
+
+    def on_execute(self, note):
+        if self._game_running:
+            member = self.members[note.member_id]
+            if self._daytime == "day" and note.member_id not in self._votes and member.status == "alive":
+                victim = self.target(note)
+                if victim is not None:
+                    self.vote(note.member_id, victim.member_id)
+                    self.send_message(f"{member.nickname} is voted for {victim.nickname}. {self.leader_text()}")
+                    self.check_votes()
+
+    def on_skip(self, note):
+        if self._game_running:
+            member = self.members[note.member_id]
+            if self._daytime == "day" and note.member_id not in self._votes and member.status == "alive":
+                self.vote(note.member_id, 0)
+                self.send_message(f"{member.nickname} is voted for skipping execution. {self.leader_text()}")
+                self.check_votes()
+
+    def on_verify(self, note):
+        if self._game_running:
+            if self.members[note.member_id].role == self._active_role \
+                    and self._active_role == "cherif" \
+                    and note.member_id not in self._votes \
+                    and self.members[note.member_id].status == "alive":
+                victim = self.target(note)
+                if victim is not None:
+                    self.send_message(f"{victim.nickname} IS {victim.role}", note.member_id)
+
+    def on_chat(self, note):
+        if self._game_running:
+            member = self.members[note.member_id]
+            if self._daytime == "night" and member.role != "citizen":
+                n = chat.Note(member_id=note.member_id, name=note.name, message=note.message)
+                self.chats.append(n, self.members.with_role(member.role))
+            elif self._daytime == "day":
+                n = chat.Note(member_id=note.member_id, name=note.name, message=note.message)
+                self.chats.append(n, self.members.with_status(member.status))
+        else:
+            # Only the line goes out, never a roster or recipients the client set
+            n = chat.Note(member_id=note.member_id, name=note.name, message=note.message)
+            self.chats.append(n)
+
+    def send_message(self, text, to=None):
+        if type(to) == int:
+            # A 1-tuple is a quarter of the size of a frozenset and is kept
+            # with the note for as long as the log holds it
+            to = (to,)
+        n = chat.Note(message=text)
+        self.chats.append(n, to)
+
+    def send_roster(self, update, to=None):
+        if type(to) == int:
+            to = (to,)
+        self.chats.append(chat.Note(roster=update), to)
+
+    def vote(self, voter_id, target_id):
+        if self._votes.vote(voter_id, target_id):
+            self.record(chat.EVENT_VOTE, member_id=voter_id, target=target_id)
+
+    def check_votes(self):
+        # Everyone who may act in this phase has voted, no need to wait
+        if self._daytime == "day":
+            eligible = self.members.count(status="alive")
+        else:
+            eligible = self.members.count(self._active_role, "alive")
+        if len(self._votes) >= eligible:
+            self.end_phase()
+
+    def leader_text(self):
+        leader = self._votes.leader
+        if leader == 0:
+            name = "skipping"
+        else:
+            name = self.members[leader].nickname if leader in self.members else "?"
+        tie = ", TIE" if self._votes.tied else ""
+        return f"LEADING: {name} ({self._votes.votes_for(leader)}{tie})"
+
+    def end_phase(self):
+        if self._phase is not None and not self._phase.done():
+            self._phase.set_result(None)
+
+    async def wait_phase(self, seconds, name="pause"):
+        self._phase = asyncio.get_running_loop().create_future()
+        timer = self._scheduler.call_later(seconds, self.end_phase)
+        if name != "pause":
+            # A turn nobody can act in, like the cherif's once the cherif is
+            # dead, or one whose votes were all in before a restart, ends now
+            self.check_votes()
+        try:
+            with metrics.timer(f"phase_{name}"):
+                await self._phase
+        finally:
+            # Also runs when /leave cancels the game, so no timer outlives it
+            timer.cancel()
+            self._phase = None
+
+    async def start_game(self):
+        self._game_running = True
+        self._votes.clear()
+        metrics.inc("games_started")
+        distribution = rules.deal(self.size)
+
+        self.send_message("STARTING GAME")
+        self.send_message(".\n" * 5)
+        for i, member in enumerate(self.members.values()):
+            member.prepare(distribution[i])
+            self.send_message(f"YOU ARE {member.role}", member.member_id)
+        self.record(
+            chat.EVENT_DEAL, to=list(self.members),
+            text=",".join(m.role for m in self.members.values())
+        )
+        self.send_roster(roster.snapshot(self.members.values(), True))
+
+        self.send_message("\nINSIDIOUS MAFIA STARTED UP IN THE CITY. YOU MUST FIND OUT WHO IT IS!\n")
+        self.send_message("IF YOU DON'T KNOW COMMANDS TYPE '/help' TO SEE LIST OF COMMANDS\n")
+
+        await self.wait_phase(self.pause_seconds)
+        await self.play()
+
+    def alive(self, role):
+        return self.members.count(role, "alive")
+
+    @property
+    def game_over(self):
+        return rules.game_over(self.alive("mafia"), self.alive("citizen") + self.alive("cherif"))
+
+    def begin(self, step):
+        # Every turn is journaled as it begins, and a recovered game resumes
+        # at the start of the turn it was in
+        self._step = step
+        self._votes.clear()
+        self._daytime = "day" if step == "day" else "night"
+        self._active_role = None if step == "day" else step
+        self.record(chat.EVENT_STEP, text=step, target=self._marked)
+
+    def kill(self, member):
+        member.dead()
+        self.record(chat.EVENT_DEAD, member_id=member.member_id)
+        self.send_roster(chat.Roster(members=[chat.RosterEntry(member_id=member.member_id, status=member.status)]))
+        # The dead see every role: the ones before learn the new spirit,
+        # the new one gets them all
+        spirits = self.members.with_status("dead") - {member.member_id}
+        if spirits:
+            self.send_roster(chat.Roster(members=[roster.entry(member, role=True)]), spirits)
+        self.send_roster(roster.snapshot(self.members.values(), True, roles=True), member.member_id)
+
+    async def play(self, step="mafia"):
+        wait_mafia, wait_cherif, wait_all = rules.phase_seconds(self.size, self.turn_seconds)
+
+        while not self.game_over:
+            if step == "mafia":
+                # A resumed turn keeps the votes already cast in it
+                if self._step != step:
+                    self.begin(step)
+                self.send_message("THE CITY FALLS ASLEEP, BUT...")
+                self.send_message("MAFIA IS DOING ITS DARK DEEDS")
+                await self.wait_phase(wait_mafia, "mafia")
+                # The mafia has to agree on someone, so a tie goes to whoever got there first
+                self._marked = self._votes.winner(VoteLedger.FIRST)
+                self._active_role = None
+                self.send_message("\nMAFIA FINISHED\n")
+                await self.wait_phase(self.pause_seconds)
+                step = "cherif"
+
+            if step == "cherif":
+                if self._step != step:
+                    self.begin(step)
+                self.send_message("CHERIF WOKE UP TO FIND MAFIA")
+                await self.wait_phase(wait_cherif, "cherif")
+                cherif_killed = self._votes.winner(VoteLedger.FIRST)
+                self._active_role = None
+                self.send_message("CHERIF FINISHED")
+                await self.wait_phase(self.pause_seconds)
+
+                dead_list = "TONIGHT WE LOST:\n"
+                for victim in (self._marked, cherif_killed):
+                    if victim and victim in self.members and self.members[victim].status == "alive":
+                        self.kill(self.members[victim])
+                        dead_list += f" - {self.members[victim].nickname}\n"
+                self._marked = None
+
+                self.begin("day")
+                self.send_message("\nGOOD MORNING\n")
+                self.send_message(dead_list)
+                if self.game_over:
+                    break
+                step = "day"
+
+            if step == "day":
+                if self._step != step:
+                    self.begin(step)
+                self.send_message("IT'S TIME TO DECIDE")
+                await self.wait_phase(wait_all, "day")
+                # A tied town executes nobody
+                executed = self._votes.winner(VoteLedger.NO_WINNER)
+                if executed:
+                    if self.members[executed].status == "alive":
+                        self.kill(self.members[executed])
+                        self.send_message(f"{self.members[executed].nickname} WAS EXECUTED")
+                else:
+                    self.send_message("VOTING WAS SKIPPED")
+                step = "mafia"
+        self.send_message(f"\n{rules.winner(self.alive('mafia'))} WON!\n")
+        metrics.inc("games_finished")
+        self.set_default()
+        self.send_roster(chat.Roster(running=False))
+
+    def set_default(self):
+        self._game_running = False
+        self._daytime = None
+        self._votes.clear()
+        self._ready.clear()
+        self._active_role = None
+        self._daytime = None
+        self._step = None
+        self._marked = None
+        self.record(chat.EVENT_END)
+
+    # Dispatch tables are shared by every room rather than built per room
+    # out of bound methods
+    _handlers = {
+        chat.CHAT: on_chat,
+        chat.LEAVE: on_leave,
+        chat.MEMBERS: on_members,
+        chat.VERIFY: on_verify,
+        chat.KILL: on_kill,
+        chat.EXECUTE: on_execute,
+        chat.SKIP: on_skip,
+        chat.SELF: on_self,
+        chat.HELP: on_help,
+        chat.READY: on_ready,
+    }
+    _replay = {
+        chat.EVENT_JOIN: replay_join,
+        chat.EVENT_READY: lambda self, e: self._ready.add(e.member_id),
+        chat.EVENT_START: replay_start,
+        chat.EVENT_DEAL: replay_deal,
+        chat.EVENT_STEP: replay_step,
+        chat.EVENT_VOTE: lambda self, e: self._votes.vote(e.member_id, e.target),
+        chat.EVENT_DEAD: lambda self, e: self.members[e.member_id].dead(),
+        chat.EVENT_END: lambda self, e: self.set_default(),
+        chat.EVENT_NOTE: replay_note,
+        chat.EVENT_LOG: lambda self, e: self.chats.seek(e.seq),
+    }
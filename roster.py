@@ -0,0 +1,46 @@
+import proto.chat_pb2 as chat
+
+
+def entry(member, role=False):
+    e = chat.RosterEntry(member_id=member.member_id, name=member.nickname, status=member.status or "")
+    if role:
+        e.role = member.role or ""
+    return e
+
+
+def snapshot(members, running, roles=False):
+    return chat.Roster(full=True, running=running, members=[entry(m, roles) for m in members])
+
+
+class Roster:
+    # A client's copy of its room's members, kept up to date by the roster
+    # notes in its stream, so /members needs no call to the server
+
+    def __init__(self):
+        self._members = {}
+        self.running = False
+
+    def apply(self, roster):
+        if roster.full:
+            self._members = {}
+        for e in roster.members:
+            current = self._members.get(e.member_id)
+            if current is None:
+                current = self._members[e.member_id] = chat.RosterEntry()
+            # Fields a delta leaves empty keep their value
+            current.MergeFrom(e)
+        for member_id in roster.left:
+            self._members.pop(member_id, None)
+        if roster.HasField("running"):
+            self.running = roster.running
+
+    def render(self, member_id):
+        lines = ["ID\tNAME\tROLE\tSTATUS" if self.running else "ID\tNAME"]
+        for e in self._members.values():
+            line = f"{e.member_id}\t{e.name}"
+            if self.running:
+                line += f"\t{e.role or '???'}\t{e.status}"
+            if e.member_id == member_id:
+                line += " << YOU"
+            lines.append(line)
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,31 @@
+class Router:
+    # Node i of n hands out room and member ids congruent to i, so every node
+    # can tell which one owns a call from its ids alone, without asking.
+
+    def __init__(self, nodes=("",), node=0):
+        self.nodes = list(nodes)
+        self.node = node
+
+    @property
+    def address(self):
+        return self.nodes[self.node]
+
+    def owner(self, some_id):
+        return (some_id - 1) % len(self.nodes)
+
+    def local(self, some_id):
+        return self.owner(some_id) == self.node
+
+    def address_of(self, some_id):
+        return self.nodes[self.owner(some_id)]
+
+    def ids(self, after=0):
+        # This node's ids greater than after, in order
+        n = len(self.nodes)
+        next_id = after + 1 + (self.node - after) % n
+        while True:
+            yield next_id
+            next_id += n
+
+    def topic(self, node=None):
+        return f"node.{self.node if node is None else node}"
@@ -0,0 +1,45 @@
+import random
+
+MAFIA = "mafia"
+CHERIF = "cherif"
+CITIZEN = "citizen"
+SPIRIT = "spirit"
+ALIVE = "alive"
+DEAD = "dead"
+
+# Members store roles and statuses as small codes, indexes into these
+ROLES = (None, MAFIA, CHERIF, CITIZEN, SPIRIT)
+STATUSES = (None, ALIVE, DEAD)
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+
+def mafia_count(size):
+    return 1 + int((size - 4) / 2)
+
+
+def distribution(size, mafias=None):
+    mafias = mafia_count(size) if mafias is None else mafias
+    return [MAFIA] * mafias + [CHERIF] + [CITIZEN] * (size - mafias - 1)
+
+
+def deal(size, rng=random):
+    roles = distribution(size)
+    rng.shuffle(roles)
+    return roles
+
+
+def phase_seconds(size, turn_seconds, mafias=None):
+    # How long the mafia, the cherif and the town may take; every player of
+    # the acting side gets turn_seconds
+    mafias = mafia_count(size) if mafias is None else mafias
+    return mafias * turn_seconds, turn_seconds, size * turn_seconds
+
+
+def game_over(mafia, town):
+    # Written with | so it works on whole arrays of games as well
+    return (mafia == 0) | (mafia >= town)
+
+
+def winner(mafia):
+    return "MAFIA" if mafia else "CITIZENS"
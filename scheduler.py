@@ -0,0 +1,59 @@
+import asyncio
+import heapq
+import itertools
+
+
+class Timer:
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class PhaseScheduler:
+    # One heap of deadlines and one driver task serve every room, instead of
+    # each game sleeping on its own.
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._changed = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def call_later(self, delay, callback):
+        loop = asyncio.get_running_loop()
+        timer = Timer(loop.time() + delay, callback)
+        heapq.heappush(self._heap, (timer.deadline, next(self._seq), timer))
+        if self._task is None or self._task.done():
+            self._changed = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        elif self._heap[0][2] is timer:
+            # The new timer is now the earliest one, so the driver has to
+            # shorten its sleep.
+            self._changed.set()
+        return timer
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            deadline, _, timer = self._heap[0]
+            if timer.cancelled:
+                heapq.heappop(self._heap)
+                continue
+            delay = deadline - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._changed.clear()
+                continue
+            heapq.heappop(self._heap)
+            timer.callback()
@@ -1,329 +1,401 @@
-from concurrent import futures
 from collections import Counter
-import time
-import random
+import asyncio
+import os
 import threading
+import time
 
 import grpc
 import proto.chat_pb2 as chat
 import proto.chat_pb2_grpc as rpc
 
-from commands import client_commands
-
-
-class Member:
-    _counter = 0
-
-    def __init__(self, nickname):
-        Member._counter += 1
-        self._nickname = nickname
-        self._member_id = self._counter
-        self._status = None
-        self._role = None
-
-    def prepare(self, role):
-        self._role = role
-        self._status = "alive"
-
-    def dead(self):
-        self._status = "dead"
-        self._role = "spirit"
-
-    @property
-    def nickname(self):
-        return self._nickname
-
-    @property
-    def member_id(self):
-        return self._member_id
-
-    @property
-    def role(self):
-        return self._role
-
-    @property
-    def status(self):
-        return self._status
+import roster
+from bus import LocalBus, SocketBus
+from chatlog import SnapshotRequired, SubscriberLagging
+from journal import Journal
+from limits import Limits, RateLimited
+from members import Member
+from metrics import metrics, sample_stacks
+from rooms import Room
+from router import Router
+from scheduler import PhaseScheduler
 
 
 class ChatServer(rpc.ChatServerServicer):
-
-    def __init__(self, size):
-        self.members = {}
-        self.chats = []
+    # Concurrency model: every room, member and log is owned by the event loop
+    # the server was created on, which is the only writer. Handlers never
+    # await in the middle of a state change, so no locks are needed, and
+    # readers (streams, /members) take copies. No other thread touches it.
+
+    def __init__(self, size, turn_seconds=15, pause_seconds=1, grace_seconds=10, journal=None,
+                 router=None, bus=None, limits=None, relays=(), spectator_limit=200):
+        self.loop = asyncio.get_running_loop()
         self.size = size
-
-        # Game Section
-        self._game_running = False
-        self._voting = []
-        self._voted = []
-        self._active_role = None
-        self._daytime = None
-
-    def ChatStream(self, request_iterator, context):
-        lastindex = 0
-        while True:
-            while len(self.chats) > lastindex:
-                n = self.chats[lastindex]
-                lastindex += 1
-                yield n
-
-    def SendNote(self, request: chat.Note, context):
-        self.message_handler(request)
+        self.turn_seconds = turn_seconds
+        self.pause_seconds = pause_seconds
+        # How long a member may go without a ChatStream before it is made to leave
+        self.grace_seconds = grace_seconds
+        # Rate limits of every room and how far its streams may lag
+        self.limits = limits or Limits()
+        # Spectators this node streams to itself before it redirects them to relays
+        self.relays = list(relays)
+        self.spectator_limit = spectator_limit
+        self._spectators = 0
+        self.scheduler = PhaseScheduler()
+        self.rooms = {}
+        # Each room is owned by one node. Notes that reach another node are
+        # forwarded to the owner over the bus; streams are redirected.
+        self.router = router or Router()
+        self.bus = bus or LocalBus()
+        self.bus.subscribe(self.router.topic(), self.on_bus)
+        self._room_ids = self.router.ids()
+        self._member_ids = self.router.ids()
+        # member_id -> room, so every call is routed with one lookup
+        self.members = {}
+        # Rooms waiting for players, in the order they were opened
+        self._open_rooms = {}
+        self._streams = 0
+        # member_id -> open ChatStreams, and eviction timers of members with none
+        self._attached = Counter()
+        self._grace = {}
+        self._loop_thread = threading.get_ident()
+        self.journal = None
+        if journal is not None:
+            self.recover(journal.load())
+            self.journal = journal
+            for room in self.rooms.values():
+                room.journal = journal
+            journal.source = self.snapshot
+            journal.open(self.snapshot())
+
+    async def ChatStream(self, request: chat.StreamRequest, context):
+        owner_id = request.member_id or request.room_id
+        if owner_id and not self.router.local(owner_id):
+            await self.redirect(context, self.router.address_of(owner_id))
+        room = self.members.get(request.member_id) or self.rooms.get(request.room_id)
+        if room is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, "UNKNOWN ROOM")
+        member_id = request.member_id if request.member_id in room.members else 0
+        # Every stream reads with its own cursor, so a client that reconnects
+        # before keepalive finds its old stream dead still gets every note.
+        # Members got a cursor when they joined, which their stream takes
+        # over; watchers start at the oldest note the room still keeps.
+        # A client that reconnects names the seq it wants next instead.
+        key = object()
+        try:
+            if request.HasField("resume_from"):
+                room.chats.resume(key, request.resume_from)
+                if member_id:
+                    # The cursor the member parked is not needed any more
+                    room.chats.unsubscribe(member_id)
+                metrics.inc("streams_resumed")
+            elif member_id:
+                room.chats.move(member_id, key)
+            else:
+                room.chats.subscribe(key, room.chats.offset)
+        except SnapshotRequired:
+            await context.abort(grpc.StatusCode.FAILED_PRECONDITION, "SNAPSHOT REQUIRED")
+        self._streams += 1
+        if member_id:
+            self.attach(member_id)
+        try:
+            while True:
+                notes = await room.chats.read(key, member_id)
+                # Time spent handing a batch to grpc, including flow control
+                t = time.perf_counter()
+                for n in notes:
+                    yield n
+                metrics.observe("stream_batch", time.perf_counter() - t)
+                metrics.inc("frames_sent", len(notes))
+                if member_id and member_id not in room.members:
+                    return
+        except SubscriberLagging:
+            metrics.inc("streams_lagging")
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "TOO FAR BEHIND")
+        finally:
+            # Also runs when grpc cancels the call because keepalive found
+            # the client gone
+            self._streams -= 1
+            if member_id and member_id in room.members and self._attached[member_id] == 1:
+                # The member's last stream leaves its cursor for the next one
+                room.chats.move(key, member_id)
+            else:
+                room.chats.unsubscribe(key)
+            if member_id:
+                self.detach(member_id)
+
+    async def Spectate(self, request: chat.SpectateRequest, context):
+        if request.room_id and not self.router.local(request.room_id):
+            await self.redirect(context, self.router.address_of(request.room_id))
+        room = self.rooms.get(request.room_id)
+        if room is None:
+            await context.abort(grpc.StatusCode.NOT_FOUND, "UNKNOWN ROOM")
+        if not request.relay and self.relays and self._spectators >= self.spectator_limit:
+            # Every spectator costs this loop a write per note, so past its
+            # share a node sends them on to the relays, which each take one
+            # stream per room from here
+            await self.redirect(context, self.relays[request.room_id % len(self.relays)])
+        metrics.inc("spectators_joined")
+        # Spectators read the room's broadcast buffer only, never its members
+        # or log, so they leave the game alone
+        self._spectators += 1
+        try:
+            async for frames in room.broadcast.watch(request.delay_seconds):
+                for frame in frames:
+                    yield frame
+                metrics.inc("frames_spectated", len(frames))
+        finally:
+            self._spectators -= 1
+
+    async def SendNote(self, request: chat.Note, context):
+        try:
+            self.route_note(request)
+        except RateLimited:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "TOO MANY MESSAGES")
         return chat.Empty()
 
-    def Connect(self, request: chat.Connection, context):
-        m = Member(request.nickname)
-        self.members[m.member_id] = m
-        n = chat.Note(message=f"{m.nickname} joined!")
-        self.chats.append(n)
-        if len(self.members) == self.size:
-            threading.Thread(target=self.start_game).start()
-        return chat.ConnectionReply(member_id=m.member_id)
-
-    def serialize_members(self, m):
-        members_text = "ID\tNAME"
-        if self._game_running:
-            members_text += "\tROLE\tSTATUS"
-        members_text += "\n"
-        for member in self.members.values():
-            members_text += f"{member.member_id}\t{member.nickname}"
-            if self._game_running:
-                if m.status == "alive":
-                    members_text += f"\t???\t{member.status}"
-                else:
-                    members_text += f"\t{member.role}\t{member.status}"
-            if member.member_id == m.member_id:
-                members_text += " << YOU"
-            members_text += "\n"
-        return members_text
-
-    def members_with_role(self, role, self_id):
-        mafias_ids = []
-        for member in self.members.values():
-            if member.role == role and member.member_id != self_id:
-                mafias_ids.append(member.member_id)
-        if not mafias_ids:
-            mafias_ids = [-1]
-        return mafias_ids
-
-    def members_with_status(self, status, self_id):
-        mafias_ids = []
-        for member in self.members.values():
-            if member.status == status and member.member_id != self_id:
-                mafias_ids.append(member.member_id)
-        if not mafias_ids:
-            mafias_ids = [-1]
-        return mafias_ids
+    async def SendNotes(self, request_iterator, context):
+        try:
+            async for note in request_iterator:
+                self.route_note(note)
+        except RateLimited:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "TOO MANY MESSAGES")
+        return chat.Empty()
 
-    def message_handler(self, note: chat.Note):
-        if note.message.startswith(client_commands.MEMBERS):
-            self.send_message(self.serialize_members(self.members[note.member_id]), note.member_id)
-        elif note.message.startswith(client_commands.LEAVE):
-            left_member = self.members[note.member_id]
-            self.members.pop(note.member_id)
-            if self._game_running:
-                self.set_default()
-                self.send_message("GAME STOPPED")
-            self.send_message(f"{left_member.nickname} left")
-        elif note.message.startswith(client_commands.HELP):
-            self.send_message(client_commands.COMMANDS_LIST, note.member_id)
-        elif note.message.startswith(client_commands.SELF):
-            if self._game_running:
-                self.send_message(f"YOU ARE {self.members[note.member_id].role}", note.member_id)
-        elif note.message.startswith(client_commands.READY):
-            if self._game_running:
-                return
-            if note.member_id not in self._voted:
-                self._voted.append(note.member_id)
-                self.send_message(f"{self.members[note.member_id].nickaname} is ready to start game")
-        elif note.message.startswith(client_commands.KILL):
-            if self._game_running:
-                member = self.members[note.member_id]
-                if member.role == self._active_role \
-                        and member.member_id not in self._voted \
-                        and member.status == "alive":
-                    try:
-                        victim_id = int(note.message.split(" ")[1])
-                        self._voted.append(member.member_id)
-                        self._voting.append(victim_id)
-                        self.send_message(
-                            f"{member.nickname} is voted for {self.members[victim_id].nickname}",
-                            self.members_with_role(member.role, member.member_id)
-                        )
-                    except:
-                        self.send_message("INCORRECT VICTIM ID", note.member_id)
-        elif note.message.startswith(client_commands.EXECUTE):
-            if self._game_running:
-                member = self.members[note.member_id]
-                if self._daytime == "day" and note.member_id not in self._voted and member.status == "alive":
-                    try:
-                        victim_id = int(note.message.split(" ")[1])
-                        self._voted.append(note.member_id)
-                        self._voting.append(victim_id)
-                        self.send_message(f"{member.nickname} is voted for {self.members[victim_id].nickname}")
-                    except:
-                        self.send_message("INCORRECT VICTIM ID", note.member_id)
-        elif note.message.startswith(client_commands.SKIP):
-            if self._game_running:
-                member = self.members[note.member_id]
-                if self._daytime == "day" and note.member_id not in self._voted and member.status == "alive":
-                    try:
-                        self._voted.append(note.member_id)
-                        self._voting.append(0)
-                        self.send_message(f"{member.nickname} is voted for skipping execution")
-                    except:
-                        self.send_message("INCORRECT VICTIM ID", note.member_id)
-        elif note.message.startswith(client_commands.VERIFY):
-            if self._game_running:
-                if self.members[note.member_id].role == self._active_role \
-                        and self._active_role == "cherif" \
-                        and note.member_id not in self._voted \
-                        and self.members[note.member_id].status == "alive":
-                    victim_id = int(note.message.split(" ")[1])
-                    victim = self.members[victim_id]
-                    self.send_message(f"{victim.nickname} IS {victim.role}", note.member_id)
-        elif self._game_running:
-            member = self.members[note.member_id]
-            if self._daytime == "night" and member.role != "citizen":
-                n = chat.Note(
-                    member_id=note.member_id, name=note.name, message=note.message,
-                    to=self.members_with_role(member.role, member.member_id)
-                )
-                self.chats.append(n)
-            elif self._daytime == "day":
-                n = chat.Note(
-                    member_id=note.member_id, name=note.name, message=note.message,
-                    to=self.members_with_status(member.status, member.member_id)
-                )
-                self.chats.append(n)
+    def route_note(self, note):
+        metrics.inc("notes_received")
+        room = self.members.get(note.member_id)
+        if room is not None:
+            with metrics.timer("handle_note"):
+                try:
+                    room.message_handler(note)
+                except RateLimited:
+                    metrics.inc("notes_limited")
+                    raise
+        elif note.member_id and not self.router.local(note.member_id):
+            metrics.inc("notes_forwarded")
+            self.bus.publish(self.router.topic(self.router.owner(note.member_id)), note.SerializeToString())
+
+    def on_bus(self, data):
+        try:
+            self.route_note(chat.Note.FromString(data))
+        except RateLimited:
+            # The sender's node already answered its call, so the note is dropped
+            pass
+
+    async def redirect(self, context, address):
+        metrics.inc("redirects")
+        await context.abort(grpc.StatusCode.UNAVAILABLE, "REDIRECT", trailing_metadata=(("redirect", address),))
+
+    async def Connect(self, request: chat.Connection, context):
+        if request.HasField("room_id"):
+            if not self.router.local(request.room_id):
+                await self.redirect(context, self.router.address_of(request.room_id))
+            room = self.rooms.get(request.room_id)
+            if room is None:
+                room = self.open_room(request.room_id)
+            elif room.full or room.running:
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "ROOM IS FULL")
         else:
-            self.chats.append(note)
-
-    def send_message(self, text, to=None):
-        if type(to) != list and to:
-            to = [to]
-        n = chat.Note(message=text, to=to)
-        self.chats.append(n)
-
-    def start_game(self):
-        self._game_running = True
-        self._voted = []
-        distribution = []
-        mafias_count = 1 + int((self.size - 4) / 2)
-        for i in range(mafias_count):
-            distribution.append("mafia")
-        distribution.append("cherif")
-        citizens_count = self.size - mafias_count - 1
-        for i in range(citizens_count):
-            distribution.append("citizen")
-        random.shuffle(distribution)
-
-        count = {
-            "mafia": mafias_count,
-            "cherif": 1,
-            "citizen": citizens_count
+            room = self.find_room()
+        m = Member(request.nickname, next(self._member_ids))
+        self.members[m.member_id] = room
+        room.join(m)
+        # Clients that never open their stream are cleaned up too
+        self.detach(m.member_id)
+        if room.full or room.running:
+            self._open_rooms.pop(room.room_id, None)
+        metrics.inc("connects")
+        # The joiner's roster goes out once here instead of into the room's log
+        members = roster.snapshot(room.members.values(), room.running)
+        return chat.ConnectionReply(member_id=m.member_id, room_id=room.room_id, roster=members)
+
+    async def Stats(self, request: chat.StatsRequest, context):
+        profile = ""
+        if request.profile_seconds > 0:
+            # The sampler sleeps in a worker thread while the loop keeps serving
+            profile = await self.loop.run_in_executor(
+                None, sample_stacks, self._loop_thread, min(request.profile_seconds, 60)
+            )
+        return chat.StatsReply(metrics=metrics.render(self.gauges()), profile=profile)
+
+    def gauges(self):
+        rooms = self.rooms.values()
+        return {
+            "rooms": len(self.rooms),
+            "rooms_open": len(self._open_rooms),
+            "games_running": sum(room.running for room in rooms),
+            "members": len(self.members),
+            "members_detached": len(self._grace),
+            "streams": self._streams,
+            "spectators": self._spectators,
+            "log_entries": sum(room.chats.retained for room in rooms),
+            "log_bytes": sum(room.chats.retained_bytes for room in rooms),
+            "timers": len(self.scheduler),
+            "journal_pending": len(self.journal) if self.journal is not None else 0,
+            "node": self.router.node,
         }
-        wait_mafia = mafias_count * 15
-        wait_cherif = 15
-        wait_all = 15 * self.size
-
-        self.send_message("STARTING GAME")
-        self.send_message(".\n" * 5)
-        for i, member in enumerate(self.members.values()):
-            member.prepare(distribution[i])
-            self.send_message(f"YOU ARE {member.role}", member.member_id)
-
-        self.send_message("\nINSIDIOUS MAFIA STARTED UP IN THE CITY. YOU MUST FIND OUT WHO IT IS!\n")
-        self.send_message("IF YOU DON'T KNOW COMMANDS TYPE '/help' TO SEE LIST OF COMMANDS\n")
-
-        time.sleep(1)
-        while count["mafia"] < count["citizen"] + count["cherif"] and count["mafia"] != 0:
-            self._daytime = "night"
-            self.send_message("THE CITY FALLS ASLEEP, BUT...")
-            self._active_role = "mafia"
-            self.send_message("MAFIA IS DOING ITS DARK DEEDS")
-            time.sleep(wait_mafia)
-            mafia_killed = None
-            if self._voting:
-                v = Counter(self._voting)
-                mafia_killed = list(v.keys())[0]
-                self._voting = []
-                self._voted = []
-            self.send_message("\nMAFIA FINISHED\n")
-            time.sleep(1)
 
-            self.send_message("CHERIF WOKE UP TO FIND MAFIA")
-            self._active_role = "cherif"
-            time.sleep(wait_cherif)
-            cherif_killed = None
-            if self._voting:
-                cherif_killed = self._voting[0]
-                self._voting = []
-                self._voted = []
-            self.send_message("CHERIF FINISHED")
-            time.sleep(1)
-
-            dead_list = "TONIGHT WE LOST:\n"
-            if mafia_killed:
-                if self.members[mafia_killed].status == "alive":
-                    role = self.members[mafia_killed].role
-                    self.members[mafia_killed].dead()
-                    count[role] -= 1
-                    dead_list += f" - {self.members[mafia_killed].nickname}\n"
-            if cherif_killed:
-                if self.members[cherif_killed].status == "alive":
-                    role = self.members[cherif_killed].role
-                    self.members[cherif_killed].dead()
-                    count[role] -= 1
-                    dead_list += f" - {self.members[cherif_killed].nickname}\n"
-
-            self._active_role = None
-            self._daytime = "day"
-            self.send_message("\nGOOD MORNING\n")
-            self.send_message(dead_list)
-            if count["mafia"] >= count["citizen"] + count["cherif"] or count["mafia"] == 0:
-                self.set_default()
-                break
-            self.send_message("IT'S TIME TO DECIDE")
-            time.sleep(wait_all)
-            executed = None
-            if self._voting:
-                v = Counter(self._voting)
-                executed = list(v.keys())[0]
-                self._voting = []
-                self._voted = []
-            if executed:
-                if self.members[executed].status == "alive":
-                    role = self.members[executed].role
-                    self.members[executed].dead()
-                    count[role] -= 1
-                    self.send_message(f"{self.members[executed].nickname} WAS EXECUTED")
+    def recover(self, events):
+        # Rebuilds every room from the snapshot and the journal tail, then
+        # lets unfinished games go on from the turn they were in
+        last_member = 0
+        for event in events:
+            if event.type == chat.EVENT_ROOM:
+                self.open_room(event.room_id)
+                continue
+            room = self.rooms.get(event.room_id)
+            if room is None:
+                continue
+            if event.type == chat.EVENT_JOIN:
+                m = room.replay_join(event)
+                self.members[m.member_id] = room
+                last_member = max(last_member, m.member_id)
+            elif event.type == chat.EVENT_LEAVE:
+                if event.member_id in room.members:
+                    self.release(room, room.members.remove(event.member_id))
+                    room.chats.unsubscribe(event.member_id)
             else:
-                self.send_message("VOTING WAS SKIPPED")
-        if count["mafia"]:
-            self.send_message("\nMAFIA WON!\n")
-        else:
-            self.send_message("\nCITIZENS WON!\n")
-        self.set_default()
-
-    def set_default(self):
-        self._daytime = None
-        self._voted = []
-        self._voting = []
-        self._active_role = None
-        self._daytime = None
+                room.apply(event)
+        if last_member:
+            self._member_ids = self.router.ids(last_member)
+        self._room_ids = self.router.ids(max(self.rooms, default=0))
+        self._open_rooms = {
+            room_id: room for room_id, room in self.rooms.items() if not (room.full or room.running)
+        }
+        for room in self.rooms.values():
+            room.resume()
+        # Players have the grace period to reconnect before they are made to leave
+        for member_id in self.members:
+            self.detach(member_id)
+        metrics.inc("rooms_recovered", len(self.rooms))
+
+    def snapshot(self):
+        events = []
+        for room in self.rooms.values():
+            events.extend(room.snapshot())
+        return events
+
+    def attach(self, member_id):
+        self._attached[member_id] += 1
+        timer = self._grace.pop(member_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def detach(self, member_id):
+        if self._attached[member_id] > 0:
+            self._attached[member_id] -= 1
+        if not self._attached[member_id] and member_id in self.members and member_id not in self._grace:
+            self._grace[member_id] = self.scheduler.call_later(self.grace_seconds, lambda: self.evict(member_id))
+
+    def evict(self, member_id):
+        self._grace.pop(member_id, None)
+        room = self.members.get(member_id)
+        if room is not None and not self._attached[member_id]:
+            metrics.inc("members_evicted")
+            # Same path as /leave, so a running game is stopped and the
+            # room is released or reopened
+            room.message_handler(chat.Note(member_id=member_id, command=chat.LEAVE))
+
+    def find_room(self):
+        for room in self._open_rooms.values():
+            return room
+        return self.open_room()
+
+    def open_room(self, room_id=None):
+        if room_id is None:
+            # Skip ids that players already picked for their own rooms
+            room_id = next(self._room_ids)
+            while room_id in self.rooms:
+                room_id = next(self._room_ids)
+        room = Room(room_id, self.size, self.release, self.scheduler, self.turn_seconds, self.pause_seconds,
+                    self.limits)
+        room.journal = self.journal
+        room.record(chat.EVENT_ROOM)
+        self.rooms[room.room_id] = room
+        self._open_rooms[room.room_id] = room
+        return room
+
+    def release(self, room, member):
+        self.members.pop(member.member_id, None)
+        self._attached.pop(member.member_id, None)
+        timer = self._grace.pop(member.member_id, None)
+        if timer is not None:
+            timer.cancel()
+        if not room.members:
+            self.rooms.pop(room.room_id, None)
+            self._open_rooms.pop(room.room_id, None)
+            room.broadcast.close()
+        elif not room.running:
+            self._open_rooms[room.room_id] = room
+
+
+# Newer grpc cancels calls that queue up faster than the server picks them
+# up, which drops streams when a whole lobby connects at once. Keepalive
+# pings find clients that vanished without closing their connection.
+SERVER_OPTIONS = [
+    ('grpc.server.max_pending_requests', 100000),
+    ('grpc.server.max_pending_requests_hard_limit', 100000),
+    ('grpc.keepalive_time_ms', 10000),
+    ('grpc.keepalive_timeout_ms', 5000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.http2.min_ping_interval_without_data_ms', 5000),
+]
+
+
+def add_servicer(servicer, server):
+    # ChatStream and Spectate yield frames ChatLog has already encoded, so
+    # they are registered ahead of the generated handlers without a serializer.
+    frames = grpc.method_handlers_generic_handler('grpc.ChatServer', {
+        'ChatStream': grpc.unary_stream_rpc_method_handler(
+            servicer.ChatStream,
+            request_deserializer=chat.StreamRequest.FromString,
+        ),
+        'Spectate': grpc.unary_stream_rpc_method_handler(
+            servicer.Spectate,
+            request_deserializer=chat.SpectateRequest.FromString,
+        ),
+    })
+    server.add_generic_rpc_handlers((frames,))
+    rpc.add_ChatServerServicer_to_server(servicer, server)
+
+
+async def serve(port, size, turn_seconds=15, pause_seconds=1, grace_seconds=10, journal_path=None,
+                nodes=None, node=0, bus_port=None, limits=None, relays=()):
+    # Streams are coroutines on one event loop, so they no longer hold a
+    # worker thread each and the player count is not capped by a pool size.
+    server = grpc.aio.server(options=SERVER_OPTIONS)
+    journal = Journal(journal_path) if journal_path else None
+    router = Router(nodes or [f"localhost:{port}"], node)
+    # Nodes in separate processes share a BusBroker (python3 bus.py)
+    bus = SocketBus(port=bus_port) if bus_port else LocalBus()
+    await bus.connect()
+    servicer = ChatServer(size, turn_seconds, pause_seconds, grace_seconds, journal, router, bus, limits, relays)
+    add_servicer(servicer, server)
+    print('Starting server. Listening...')
+    server.add_insecure_port('[::]:' + str(port))
+    await server.start()
+    await server.wait_for_termination()
 
 
 if __name__ == '__main__':
     port = 5000
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
     try:
         server_size = max(4, int(input("Enter server size (min is 4):\n")))
     except:
         server_size = 4
-    rpc.add_ChatServerServicer_to_server(ChatServer(server_size), server)
-    print('Starting server. Listening...')
-    server.add_insecure_port('[::]:' + str(port))
-    server.start()
-    server.wait_for_termination()
+    # Several nodes share the load when MAFIA_NODES lists all of their
+    # addresses and MAFIA_NODE is this one's index in it
+    nodes = os.environ.get("MAFIA_NODES")
+    node = int(os.environ.get("MAFIA_NODE", 0))
+    if nodes:
+        nodes = nodes.split(",")
+        port = int(nodes[node].rsplit(":", 1)[1])
+    bus_port = int(os.environ["MAFIA_BUS"]) if "MAFIA_BUS" in os.environ else None
+    # Spectators beyond what a node streams itself go to these relay.py addresses
+    relays = os.environ["MAFIA_RELAYS"].split(",") if "MAFIA_RELAYS" in os.environ else ()
+    # Rooms and running games survive a restart through this file
+    asyncio.run(serve(
+        port, server_size, journal_path=f"mafia{node if nodes else ''}.journal",
+        nodes=nodes, node=node, bus_port=bus_port, relays=relays
+    ))
@@ -0,0 +1,234 @@
+import asyncio
+import collections
+
+import grpc
+
+import proto.chat_pb2 as chat
+import proto.chat_pb2_grpc as rpc
+
+from commands import client_commands, parse_command
+from roster import Roster
+
+# Pings keep idle connections alive and tell the server the client is still there
+CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 10000),
+    ('grpc.keepalive_timeout_ms', 5000),
+    ('grpc.keepalive_permit_without_calls', 1),
+]
+# Pause before calling a node again that could not be reached
+RETRY_SECONDS = 1
+
+
+def redirect_target(error):
+    # A node answers calls for rooms it does not own with the owner's address
+    for key, value in error.trailing_metadata() or ():
+        if key == "redirect":
+            return value
+    return None
+
+
+class Sessions:
+    # Any number of player sessions in one event loop. Each node gets a single
+    # channel, and every session's calls to it run as HTTP/2 streams over that
+    # one connection, so a thousand players cost a thousand streams and not a
+    # thousand connections or threads.
+
+    def __init__(self, address, options=CHANNEL_OPTIONS):
+        self.address = address
+        self._options = options
+        self._channels = {}
+        self._stubs = {}
+
+    def stub(self, address=None):
+        address = address or self.address
+        stub = self._stubs.get(address)
+        if stub is None:
+            self._channels[address] = grpc.aio.insecure_channel(address, options=self._options)
+            stub = self._stubs[address] = rpc.ChatServerStub(self._channels[address])
+        return stub
+
+    async def ready(self, address=None, timeout=None):
+        self.stub(address)
+        await asyncio.wait_for(self._channels[address or self.address].channel_ready(), timeout)
+
+    async def connect(self, nickname, room_id=None):
+        session = Session(self, nickname)
+        await session.connect(room_id)
+        return session
+
+    async def spectate(self, room_id, delay=0):
+        # A room's public Notes, without taking a seat; ends when the room does
+        address = self.address
+        request = chat.SpectateRequest(room_id=room_id, delay_seconds=delay)
+        while True:
+            try:
+                async for note in self.stub(address).Spectate(request):
+                    yield note
+                return
+            except grpc.aio.AioRpcError as e:
+                if e.code() != grpc.StatusCode.UNAVAILABLE:
+                    raise
+                address = redirect_target(e)
+                if address is None:
+                    address = self.address
+                    await asyncio.sleep(RETRY_SECONDS)
+
+    async def close(self):
+        for channel in self._channels.values():
+            await channel.close()
+        self._channels = {}
+        self._stubs = {}
+
+
+class Session:
+    # One player: the seat Connect gives it, its ChatStream and one upstream
+    # of Notes. The stream is read with `async for note in session`, or by
+    # run(), which hands every Note to on_note(); subclasses override the on_
+    # methods to react. Dropped calls are made again, from the owner's
+    # address when a node redirects, and the stream resumes right after the
+    # last Note received.
+
+    def __init__(self, sessions, nickname, address=None, upstream=None):
+        self.sessions = sessions
+        self.nickname = nickname
+        self.id = None
+        self.room_id = None
+        # Starts as of joining and follows the roster notes in the stream
+        self.roster = Roster()
+        # The node that owns the member, and the one its notes go through;
+        # other nodes forward them to the owner
+        self.address = address or sessions.address
+        self.upstream = upstream
+        self._cursor = None
+        self._outbox = None
+        self._posted = None
+        self._sender = None
+        # Counts the SendNotes calls made, so only the latest one reads the outbox
+        self._upstreams = 0
+
+    async def connect(self, room_id=None):
+        request = chat.Connection(nickname=self.nickname, room_id=room_id)
+        while True:
+            try:
+                reply = await self.sessions.stub(self.address).Connect(request)
+                break
+            except grpc.aio.AioRpcError as e:
+                address = e.code() == grpc.StatusCode.UNAVAILABLE and redirect_target(e)
+                if not address:
+                    raise
+                self.address = address
+        self.id = reply.member_id
+        self.room_id = reply.room_id
+        self.roster.apply(reply.roster)
+        return reply
+
+    def __aiter__(self):
+        return self.notes()
+
+    async def notes(self):
+        while True:
+            request = chat.StreamRequest(member_id=self.id, resume_from=self._cursor)
+            try:
+                async for note in self.sessions.stub(self.address).ChatStream(request):
+                    self._cursor = note.seq + 1
+                    if note.HasField("roster"):
+                        self.roster.apply(note.roster)
+                    yield note
+                return
+            except grpc.aio.AioRpcError as e:
+                if e.code() in (grpc.StatusCode.FAILED_PRECONDITION, grpc.StatusCode.RESOURCE_EXHAUSTED):
+                    # The gap is gone from the server, or the session fell so
+                    # far behind that the server cut its stream: carry on
+                    # from now and ask for the members again
+                    self._cursor = None
+                    self.on_gap()
+                    self.send(client_commands.MEMBERS)
+                    continue
+                if e.code() != grpc.StatusCode.UNAVAILABLE:
+                    raise
+                address = redirect_target(e)
+                if address is not None:
+                    self.address = address
+                    continue
+            await asyncio.sleep(RETRY_SECONDS)
+
+    async def run(self):
+        # Until the member leaves; notes still waiting go up before it returns
+        try:
+            async for note in self:
+                self.on_note(note)
+        finally:
+            await self.close()
+
+    def on_note(self, note):
+        pass
+
+    def on_gap(self):
+        pass
+
+    def on_limited(self, details):
+        pass
+
+    def note(self, message):
+        # Raises ValueError for a command with a bad target
+        command, target = parse_command(message)
+        return chat.Note(member_id=self.id, name=self.nickname, message=message, command=command, target=target)
+
+    def send(self, message):
+        self.post(self.note(message))
+
+    def leave(self):
+        self.send(client_commands.LEAVE)
+
+    def post(self, note):
+        # Queued for the session's SendNotes stream, which is opened on the
+        # first note; lines go up in the order they were posted
+        if self._sender is None:
+            self._outbox = collections.deque()
+            self._posted = asyncio.Event()
+            self._sender = asyncio.get_running_loop().create_task(self._send_notes())
+        self._outbox.append(note)
+        self._posted.set()
+
+    async def send_note(self, note):
+        # One unary call that returns once the server has taken the note;
+        # raises AioRpcError with RESOURCE_EXHAUSTED when it is over the limit
+        await self.sessions.stub(self.upstream or self.address).SendNote(note)
+
+    async def _send_notes(self):
+        while True:
+            self._upstreams += 1
+            try:
+                await self.sessions.stub(self.upstream or self.address).SendNotes(self._notes(self._upstreams))
+                return
+            except grpc.aio.AioRpcError as e:
+                if e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+                    # The server ends the stream of a client that sends too
+                    # fast; the notes it dropped are lost and a new one opens
+                    self.on_limited(e.details())
+                    continue
+                if e.code() != grpc.StatusCode.UNAVAILABLE:
+                    raise
+            await asyncio.sleep(RETRY_SECONDS)
+
+    async def _notes(self, upstream):
+        # grpc may still be waiting on the generator of a call that failed,
+        # so that one returns instead of taking the notes meant for the next
+        while True:
+            if not self._outbox:
+                self._posted.clear()
+                await self._posted.wait()
+                continue
+            if upstream != self._upstreams:
+                return
+            note = self._outbox.popleft()
+            if note is None:
+                return
+            yield note
+
+    async def close(self):
+        if self._sender is not None:
+            sender, self._sender = self._sender, None
+            self._outbox.append(None)
+            self._posted.set()
+            await sender
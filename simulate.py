@@ -0,0 +1,196 @@
+import argparse
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import rules
+
+CITIZEN, MAFIA, CHERIF = 0, 1, 2
+CODES = {rules.CITIZEN: CITIZEN, rules.MAFIA: MAFIA, rules.CHERIF: CHERIF}
+
+
+class Strategy:
+    # How the simulated players behave
+
+    def __init__(self, think=5.0, skip=0.2, trust=0.8, checks=1, shoot=0.0):
+        # Mean seconds before a player acts in a phase
+        self.think = think
+        # Chance that a day voter votes to skip
+        self.skip = skip
+        # Chance that a town voter follows the cherif to a mafia he found
+        self.trust = trust
+        # Players the cherif verifies each night
+        self.checks = checks
+        # Chance that the cherif shoots someone he has not verified
+        self.shoot = shoot
+
+
+def choose(rng, mask):
+    # One random True column of every row, -1 for rows without any
+    keys = np.where(mask, rng.random(mask.shape), -1.0)
+    return np.where(mask.any(axis=1), keys.argmax(axis=1), -1)
+
+
+def choose_each(rng, mask):
+    # One random True column of its row for every cell, without building a
+    # games x players x players array: True columns are sorted first and a
+    # random rank is taken among them
+    counts = mask.sum(axis=1)
+    order = np.argsort(~mask, axis=1, kind="stable")
+    ranks = (rng.random(mask.shape) * counts[:, None]).astype(np.int64)
+    return np.where(counts[:, None] > 0, np.take_along_axis(order, ranks, axis=1), -1)
+
+
+def phase_time(react, eligible, voted, limit):
+    # Like Room.check_votes: a phase ends once everyone who may vote has,
+    # at once if nobody may, otherwise when its timer runs out
+    longest = np.where(eligible, react, 0).max(axis=1)
+    everyone = (voted | ~eligible).all(axis=1)
+    return np.where(everyone, longest, limit)
+
+
+def over(alive, mafia):
+    return rules.game_over((alive & mafia).sum(axis=1), (alive & ~mafia).sum(axis=1))
+
+
+def simulate(size, games, strategy, turn_seconds=15, pause_seconds=1, mafias=None, rng=None):
+    # Plays a batch of games of one lobby size in lockstep, one array row
+    # per game. Strategies treat every seat alike, so roles are not shuffled.
+    rng = rng or np.random.default_rng()
+    roles = np.array([CODES[role] for role in rules.distribution(size, mafias)], dtype=np.int8)
+    mafia = np.tile(roles == MAFIA, (games, 1))
+    cherif = np.tile(roles == CHERIF, (games, 1))
+    wait_mafia, wait_cherif, wait_all = rules.phase_seconds(size, turn_seconds, mafias)
+    rows = np.arange(games)
+    shape = (games, size)
+
+    alive = np.ones(shape, bool)
+    cleared = np.zeros(shape, bool)
+    exposed = np.zeros(shape, bool)
+    running = ~over(alive, mafia)
+    nights = np.zeros(games, np.int32)
+    seconds = np.full(games, float(pause_seconds))
+
+    # Games where nobody ever dies would run forever
+    for _ in range(4 * size):
+        if not running.any():
+            break
+        live = alive & running[:, None]
+
+        # The mafia agree on one victim and all vote for it
+        react = rng.exponential(strategy.think, shape)
+        eligible = live & mafia
+        voted = eligible & (react < wait_mafia)
+        marked = np.where(voted.any(axis=1), choose(rng, live & ~mafia), -1)
+        seconds += np.where(running, phase_time(react, eligible, voted, wait_mafia) + pause_seconds, 0)
+
+        # The cherif verifies players and shoots the first mafia he finds
+        react = rng.exponential(strategy.think, shape)
+        eligible = live & cherif
+        acting = (eligible & (react < wait_cherif)).any(axis=1)
+        for _ in range(strategy.checks):
+            suspect = choose(rng, live & ~cherif & ~cleared & ~exposed)
+            checked = acting & (suspect >= 0)
+            games_checked, seats = rows[checked], suspect[checked]
+            exposed[games_checked, seats] = mafia[games_checked, seats]
+            cleared[games_checked, seats] = ~mafia[games_checked, seats]
+        target = choose(rng, live & exposed)
+        blind = np.where(rng.random(games) < strategy.shoot, choose(rng, live & ~cherif & ~cleared), -1)
+        shot = np.where(acting, np.where(target >= 0, target, blind), -1)
+        voted = eligible & (shot >= 0)[:, None]
+        seconds += np.where(running, phase_time(react, eligible, voted, wait_cherif) + pause_seconds, 0)
+
+        for victim in (marked, shot):
+            hit = victim >= 0
+            alive[rows[hit], victim[hit]] = False
+        nights += running
+        running &= ~over(alive, mafia)
+        live = alive & running[:, None]
+
+        # The town votes: the mafia against a random townsman, the town for
+        # the mafia the cherif exposed if they trust him, else at random
+        react = rng.exponential(strategy.think, shape)
+        voted = live & (react < wait_all)
+        accused = choose(rng, live & exposed)
+        follow = (accused >= 0)[:, None] & (rng.random(shape) < strategy.trust)
+        ballot = np.where(follow, accused[:, None], choose_each(rng, live))
+        ballot = np.where(mafia, choose_each(rng, live & ~mafia), ballot)
+        # Column `size` counts the votes to skip
+        ballot = np.where(rng.random(shape) < strategy.skip, size, ballot)
+        voted &= ballot >= 0
+        tally = np.bincount(
+            (rows[:, None] * (size + 1) + ballot)[voted], minlength=games * (size + 1)
+        ).reshape(games, size + 1)
+        top = tally.max(axis=1)
+        leader = tally.argmax(axis=1)
+        # A tied town executes nobody
+        tied = (tally == top[:, None]).sum(axis=1) > 1
+        executed = np.where((top > 0) & ~tied & (leader < size), leader, -1)
+        hit = executed >= 0
+        alive[rows[hit], executed[hit]] = False
+        seconds += np.where(running, phase_time(react, live, voted, wait_all), 0)
+        running &= ~over(alive, mafia)
+
+    return {
+        "mafia_won": (alive & mafia).any(axis=1) & ~running,
+        "finished": ~running,
+        "nights": nights,
+        "seconds": seconds,
+    }
+
+
+def parse_sizes(text):
+    sizes = []
+    for part in text.split(","):
+        low, _, high = part.partition("-")
+        sizes.extend(range(int(low), int(high or low) + 1))
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of the game rules for balancing")
+    parser.add_argument("--sizes", default="4-12", help="lobby sizes, e.g. 4-8,10")
+    parser.add_argument("--games", type=int, default=1000000, help="games per size and timer")
+    parser.add_argument("--batch", type=int, default=100000, help="games simulated at once")
+    parser.add_argument("--turn", default="15", help="comma-separated seconds per player per phase")
+    parser.add_argument("--pause", type=float, default=1)
+    parser.add_argument("--mafia", type=int, help="mafia count instead of the rule in rules.py")
+    parser.add_argument("--think", type=float, default=5.0, help="mean seconds before a player acts")
+    parser.add_argument("--skip", type=float, default=0.2)
+    parser.add_argument("--trust", type=float, default=0.8)
+    parser.add_argument("--checks", type=int, default=1)
+    parser.add_argument("--shoot", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if np is None:
+        raise SystemExit("simulate.py needs numpy: pip install numpy")
+
+    rng = np.random.default_rng(args.seed)
+    strategy = Strategy(args.think, args.skip, args.trust, args.checks, args.shoot)
+    print("size  mafia  turn   mafia won  unfinished  nights  minutes p50/p90   games/s")
+    for size in parse_sizes(args.sizes):
+        for turn in (float(t) for t in args.turn.split(",")):
+            t = time.perf_counter()
+            batches = []
+            for start in range(0, args.games, args.batch):
+                games = min(args.batch, args.games - start)
+                batches.append(simulate(size, games, strategy, turn, args.pause, args.mafia, rng))
+            result = {key: np.concatenate([b[key] for b in batches]) for key in batches[0]}
+            elapsed = time.perf_counter() - t
+            finished = result["finished"]
+            minutes = result["seconds"][finished] / 60
+            print(
+                f"{size:4d}  {args.mafia or rules.mafia_count(size):5d}  {turn:4g}"
+                f"  {result['mafia_won'][finished].mean() * 100:9.1f}%"
+                f"  {(~finished).mean() * 100:9.2f}%"
+                f"  {result['nights'][finished].mean():6.2f}"
+                f"  {np.percentile(minutes, 50):7.1f}/{np.percentile(minutes, 90):<7.1f}"
+                f"  {args.games / elapsed:9.0f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
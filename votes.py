@@ -0,0 +1,85 @@
+from array import array
+
+
+class VoteLedger:
+    # Tie-break rules for winner()
+    NO_WINNER = "none"  # a tie decides nothing
+    FIRST = "first"  # the target that reached the top count first wins
+
+    def __init__(self, members):
+        # Votes are kept by seat in the room's MemberRegistry, in int
+        # arrays: per voter the target's seat + 1, 0 for skipping and -1
+        # for no vote yet; per target seat + 1 its count, skips at 0
+        self._members = members
+        self._ballots = array("i")
+        self._tally = array("i", [0])
+        # Voter seats in the order they voted
+        self._order = array("i")
+        self._leader = None
+        self._top = 0
+        # How many targets share the top count, so ties are known in O(1)
+        self._at_top = 0
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, voter_id):
+        voter = self._members.get(voter_id)
+        return voter is not None and voter.seat < len(self._ballots) and self._ballots[voter.seat] >= 0
+
+    def _slot(self, member_id):
+        return self._members[member_id].seat + 1 if member_id else 0
+
+    def vote(self, voter_id, target_id):
+        voter = self._members[voter_id].seat
+        seats = self._members.seats
+        if len(self._ballots) < seats:
+            self._ballots.extend([-1] * (seats - len(self._ballots)))
+            self._tally.extend([0] * (seats + 1 - len(self._tally)))
+        if self._ballots[voter] >= 0:
+            return False
+        target = self._slot(target_id)
+        self._ballots[voter] = target
+        self._order.append(voter)
+        count = self._tally[target] + 1
+        self._tally[target] = count
+        if count > self._top:
+            self._leader = target_id
+            self._top = count
+            self._at_top = 1
+        elif count == self._top:
+            self._at_top += 1
+        return True
+
+    def ballots(self):
+        # In the order they were cast, so replaying them gives the same leader
+        for voter in self._order:
+            target = self._ballots[voter]
+            yield self._members.at(voter).member_id, self._members.at(target - 1).member_id if target else 0
+
+    def votes_for(self, target_id):
+        target = self._slot(target_id)
+        return self._tally[target] if target < len(self._tally) else 0
+
+    @property
+    def leader(self):
+        return self._leader
+
+    @property
+    def tied(self):
+        return self._at_top > 1
+
+    def winner(self, tie_break=NO_WINNER):
+        if self.tied and tie_break == self.NO_WINNER:
+            return None
+        return self._leader
+
+    def clear(self):
+        # Resets only the seats that voted
+        for voter in self._order:
+            self._tally[self._ballots[voter]] = 0
+            self._ballots[voter] = -1
+        del self._order[:]
+        self._leader = None
+        self._top = 0
+        self._at_top = 0